@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Run the web search probe scripts concurrently against one shared async client
+"""
+import asyncio
+import logging
+import anthropic
+import os
+
+from test_web_search import test_simple_web_search
+from test_enhanced_web_search import test_enhanced_web_search_agent
+
+# Probes allowed in flight at once; keep at or below the account's request rate limit
+PROBE_CONCURRENCY = int(os.getenv('PROBE_CONCURRENCY', '2'))
+
+async def run_probes():
+    client = anthropic.AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+    semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+    try:
+        await asyncio.gather(
+            test_simple_web_search(client, semaphore),
+            test_enhanced_web_search_agent(client, semaphore),
+        )
+    finally:
+        await client.close()
+
+if __name__ == '__main__':
+    # Set LOG_LEVEL=DEBUG for response details
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+    asyncio.run(run_probes())
@@ -1,27 +1,230 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 import praw
 import anthropic
 import google.generativeai as genai
 import os
+import json
+import functools
+import heapq
+import orjson
+import logging
 import time
 import random
 import requests
+import httpx
+import lxml.html
 import re
+import string
 import asyncio
-from urllib.parse import urlparse, parse_qs, quote, urlencode
+import atexit
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs, quote, quote_plus
 from datetime import datetime, timezone
-from collections import Counter
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import MappingProxyType
 import statistics
 from playwright.async_api import async_playwright
 
+# google-re2 (optional) matches in linear time with no backtracking; it is only
+# used for the URL patterns that scan whole search result pages
+try:
+    import re2 as _page_re
+except ImportError:
+    _page_re = re
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configure Gemini API
 genai.configure(api_key=os.getenv("GOOGLE_AI_API_KEY"))
 
 app = Flask(__name__)
 
+# Patterns used on every agent response
+_REDDIT_URL_RE = re.compile(r'https?://(?:www\.)?reddit\.com/r/\w+/comments/[\w/]+')
+_SUBREDDIT_RE = re.compile(r'reddit\.com/r/([^/]+)')
+_WHITESPACE_RE = re.compile(r'\s+')
+_BATCHED_JSON_RE = re.compile(r'```json\s*(\[.*\])\s*```', re.DOTALL)
+
+# Patterns used when scraping search result pages for Reddit threads:
+# absolute URLs, scheme-less URLs, then site-relative paths
+_REDDIT_THREAD_URL_RES = (
+    _page_re.compile(r'https://(?:www\.)?reddit\.com/r/[^/]+/comments/[^/\s"\'<>&]+'),
+    _page_re.compile(r'reddit\.com/r/[^/]+/comments/[^/\s"\'<>&]+'),
+    _page_re.compile(r'/r/[^/]+/comments/[^/\s"\'<>&]+'),
+)
+_URL_JUNK_RE = re.compile(r'[^\w\-\./:]')
+_JSON_OBJECT_BLOCK_RE = re.compile(r'```json\s*(\{.*?\})\s*```', re.DOTALL)
+_JSON_ARRAY_BLOCK_RE = re.compile(r'```json\s*(\[.*?\])\s*```', re.DOTALL)
+
+# Shared session for the synchronous search fallbacks so connections to
+# Google and DuckDuckGo are kept alive between requests
+_HTTP = requests.Session()
+
+# Async work (agents, coordinator, browser search) runs on one long-lived event
+# loop in a background thread. Clients and the browser bound to it stay warm
+# across requests instead of being rebuilt with a fresh loop each time.
+_async_loop = asyncio.new_event_loop()
+threading.Thread(target=_async_loop.run_forever, name="async-loop", daemon=True).start()
+
+def run_async(coro):
+    """Run a coroutine on the shared background event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _async_loop).result()
+
+# Expensive clients are created lazily on the background loop and then shared
+_async_anthropic_client = None
+_anthropic_client_lock = asyncio.Lock()
+_playwright = None
+_browser = None
+_browser_lock = asyncio.Lock()
+
+async def get_async_anthropic_client():
+    """Return the shared AsyncAnthropic client, creating it on first use"""
+    global _async_anthropic_client
+    async with _anthropic_client_lock:
+        if _async_anthropic_client is None:
+            _async_anthropic_client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    return _async_anthropic_client
+
+_context_pool = None
+
+# One browser context per expected concurrent search; each gets its own user agent
+BROWSER_USER_AGENTS = (
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5) AppleWebKit/605.1.15',
+)
+
+async def get_browser():
+    """Return the shared headless Chromium instance, launching it on first use"""
+    global _playwright, _browser, _context_pool
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(headless=True)
+            # Contexts from a previous browser died with it
+            _context_pool = asyncio.Queue()
+            for user_agent in BROWSER_USER_AGENTS:
+                _context_pool.put_nowait(await _browser.new_context(user_agent=user_agent))
+    return _browser
+
+@asynccontextmanager
+async def browser_context():
+    """
+    Check a context out of the shared pool for one search. Waits when every
+    context is busy, which caps concurrent browser searches at the pool size.
+    """
+    await get_browser()
+    pool = _context_pool
+    context = await pool.get()
+    try:
+        yield context
+    finally:
+        pool.put_nowait(context)
+
+def warm_up_browser():
+    """
+    Start launching the shared browser on the background loop without waiting,
+    so the first search that needs it does not pay Chromium's startup cost
+    """
+    def report(future):
+        if future.exception() is not None:
+            logger.warning("⚠️ Browser warm-up failed: %s", future.exception())
+    
+    asyncio.run_coroutine_threadsafe(get_browser(), _async_loop).add_done_callback(report)
+
+async def close_browser():
+    """Shut down the shared browser and its Playwright driver"""
+    global _playwright, _browser, _context_pool
+    async with _browser_lock:
+        _context_pool = None
+        if _browser is not None:
+            await _browser.close()
+            _browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
+
+_http_client = None
+_http_client_lock = asyncio.Lock()
+
+async def get_http_client():
+    """Return the shared httpx client used for plain HTML fetches"""
+    global _http_client
+    async with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.AsyncClient(
+                http2=True,
+                follow_redirects=True,
+                timeout=10,
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+                    'Accept-Language': 'en-US,en;q=0.5'
+                }
+            )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    async with _http_client_lock:
+        if _http_client is not None:
+            await _http_client.aclose()
+            _http_client = None
+
+@atexit.register
+def _close_async_resources_at_exit():
+    if _browser is None and _playwright is None and _http_client is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(close_browser(), _async_loop).result(timeout=10)
+        asyncio.run_coroutine_threadsafe(close_http_client(), _async_loop).result(timeout=10)
+    except Exception as e:
+        print(f"⚠️ Failed to close shared clients on shutdown: {e}")
+
+# Claude pricing (as of 2024) - per million tokens
+CLAUDE_PRICING = MappingProxyType({
+    'claude-3-5-haiku-20241022': MappingProxyType({'input': 0.25, 'output': 1.25}),      # Haiku
+    'claude-3-5-sonnet-20241022': MappingProxyType({'input': 3.00, 'output': 15.00}),    # Sonnet
+    'claude-3-opus-20240229': MappingProxyType({'input': 15.00, 'output': 75.00})        # Opus
+})
+
+# Gemini pricing (as of 2024) - per million tokens
+GEMINI_PRICING = MappingProxyType({
+    'gemini-1.5-flash': MappingProxyType({'input': 0.075, 'output': 0.30}),             # Flash (free tier available)
+    'gemini-1.5-pro': MappingProxyType({'input': 3.50, 'output': 10.50})               # Pro
+})
+
+# enhanced_links is keyed by model-supplied search terms, which may come back
+# as numbers; json.dumps stringified those keys, orjson needs to be told to
+JSON_DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def json_response(payload, status: int = 200):
+    """Serialize a response body with orjson, which is much faster than jsonify on large analyses"""
+    return app.response_class(orjson.dumps(payload, option=JSON_DUMPS_OPTIONS), status=status, mimetype='application/json')
+
+def sse_event(payload: dict, event: str = None) -> str:
+    """Format one server-sent event carrying a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {orjson.dumps(payload, option=JSON_DUMPS_OPTIONS).decode()}\n\n"
+
+# Per-token prices, so cost estimates are a single multiply per component
+def per_token_pricing(pricing):
+    return MappingProxyType({
+        model: MappingProxyType({kind: price / 1_000_000 for kind, price in prices.items()})
+        for model, prices in pricing.items()
+    })
+
+CLAUDE_PER_TOKEN = per_token_pricing(CLAUDE_PRICING)
+GEMINI_PER_TOKEN = per_token_pricing(GEMINI_PRICING)
+
 @app.route('/api/estimate-cost', methods=['POST'])
 def estimate_cost():
     """Estimate the cost of a search request"""
@@ -34,119 +237,123 @@ def estimate_cost():
     agent_count = data.get('agent_count', 3)
     coordinator_model = data.get('coordinator_model', 'claude-3-5-sonnet-20241022')
     
-    # Claude pricing (as of 2024) - per million tokens
-    claude_pricing = {
-        'claude-3-5-haiku-20241022': {'input': 0.25, 'output': 1.25},      # Haiku
-        'claude-3-5-sonnet-20241022': {'input': 3.00, 'output': 15.00},    # Sonnet
-        'claude-3-opus-20240229': {'input': 15.00, 'output': 75.00}        # Opus
-    }
-    
-    # Gemini pricing (as of 2024) - per million tokens
-    gemini_pricing = {
-        'gemini-1.5-flash': {'input': 0.075, 'output': 0.30},             # Flash (free tier available)
-        'gemini-1.5-pro': {'input': 3.50, 'output': 10.50}               # Pro
-    }
-    
+    # Estimates only depend on a few small inputs, so the serialized responses
+    # are cached and repeated slider tweaks skip the arithmetic and encoding
     if use_web_search:
-        # Multi-agent web search cost estimation
-        
-        # Each Haiku agent: ~1000 tokens input + 500 tokens output per agent
-        agent_input_tokens = agent_count * 1000
-        agent_output_tokens = agent_count * 500
-        
-        # Coordinator model: ~3000 tokens input (agent results) + 1000 tokens output
-        coordinator_input_tokens = 3000
-        coordinator_output_tokens = 1000
-        
-        # Total tokens
-        total_input_tokens = agent_input_tokens + coordinator_input_tokens
-        total_output_tokens = agent_output_tokens + coordinator_output_tokens
-        
-        # Calculate agent costs (always Haiku)
-        haiku_pricing = claude_pricing['claude-3-5-haiku-20241022']
-        agent_input_cost = (agent_input_tokens / 1_000_000) * haiku_pricing['input']
-        agent_output_cost = (agent_output_tokens / 1_000_000) * haiku_pricing['output']
-        
-        # Calculate coordinator costs
-        coordinator_pricing = claude_pricing.get(coordinator_model, claude_pricing['claude-3-5-sonnet-20241022'])
-        coordinator_input_cost = (coordinator_input_tokens / 1_000_000) * coordinator_pricing['input']
-        coordinator_output_cost = (coordinator_output_tokens / 1_000_000) * coordinator_pricing['output']
-        
-        total_cost = agent_input_cost + agent_output_cost + coordinator_input_cost + coordinator_output_cost
-        
-        return jsonify({
-            'search_mode': 'multi_agent_web_search',
-            'estimated_tokens': {
-                'agent_input': agent_input_tokens,
-                'agent_output': agent_output_tokens,
-                'coordinator_input': coordinator_input_tokens,
-                'coordinator_output': coordinator_output_tokens,
-                'total_input': total_input_tokens,
-                'total_output': total_output_tokens,
-                'total': total_input_tokens + total_output_tokens
-            },
-            'costs': {
-                'agent_cost': round(agent_input_cost + agent_output_cost, 4),
-                'coordinator_cost': round(coordinator_input_cost + coordinator_output_cost, 4),
-                'total': round(total_cost, 4)
-            },
-            'agent_count': agent_count,
-            'coordinator_model': coordinator_model,
-            'agent_model': 'claude-3-5-haiku-20241022'
-        })
-    
+        body = estimate_web_search_cost_json(agent_count, coordinator_model)
     else:
-        # Traditional Reddit search cost estimation
-        
-        # Estimate token usage based on posts
-        # Rough estimates: each post ~300 tokens, each comment ~50 tokens, 5 comments per post
-        estimated_input_tokens = max_posts * (300 + 5 * 50) + 500  # +500 for prompt overhead
-        estimated_output_tokens = 400  # Typical summary length
-        
-        # Determine pricing based on model
-        if model.startswith('gemini-'):
-            pricing = gemini_pricing.get(model, gemini_pricing['gemini-1.5-flash'])
-            ai_provider = 'gemini'
-        else:
-            pricing = claude_pricing.get(model, claude_pricing['claude-3-5-sonnet-20241022'])
-            ai_provider = 'claude'
-        
-        input_cost = (estimated_input_tokens / 1_000_000) * pricing['input']
-        output_cost = (estimated_output_tokens / 1_000_000) * pricing['output']
-        total_cost = input_cost + output_cost
-        
-        # Reddit API is free for reasonable usage
-        reddit_cost = 0.0
-        
-        # Handle free tier for Gemini
-        if model == 'gemini-1.5-flash':
-            # Check if within free tier limits (simplified check)
-            total_cost = 0.0  # Assume free tier for cost estimation
-            input_cost = 0.0
-            output_cost = 0.0
-        
-        return jsonify({
-            'search_mode': 'traditional_reddit_search',
-            'estimated_tokens': {
-                'input': estimated_input_tokens,
-                'output': estimated_output_tokens,
-                'total': estimated_input_tokens + estimated_output_tokens
-            },
-            'costs': {
-                'reddit_api': reddit_cost,
-                f'{ai_provider}_input': round(input_cost, 4),
-                f'{ai_provider}_output': round(output_cost, 4),
-                f'{ai_provider}_total': round(input_cost + output_cost, 4),
-                'total': round(total_cost + reddit_cost, 4)
-            },
-            'model': model,
-            'ai_provider': ai_provider,
-            'posts': max_posts
-        })
+        body = estimate_traditional_cost_json(max_posts, model)
+    return app.response_class(body, mimetype='application/json')
+
+@functools.lru_cache(maxsize=256)
+def estimate_web_search_cost_json(agent_count: int, coordinator_model: str) -> bytes:
+    """Multi-agent web search cost estimate, serialized as JSON"""
+    # Each Haiku agent: ~1000 tokens input + 500 tokens output per agent
+    agent_input_tokens = agent_count * 1000
+    agent_output_tokens = agent_count * 500
+    
+    # Coordinator model: ~3000 tokens input (agent results) + 1000 tokens output
+    coordinator_input_tokens = 3000
+    coordinator_output_tokens = 1000
+    
+    # Total tokens
+    total_input_tokens = agent_input_tokens + coordinator_input_tokens
+    total_output_tokens = agent_output_tokens + coordinator_output_tokens
+    
+    # Calculate agent costs (always Haiku)
+    haiku_pricing = CLAUDE_PER_TOKEN['claude-3-5-haiku-20241022']
+    agent_input_cost = agent_input_tokens * haiku_pricing['input']
+    agent_output_cost = agent_output_tokens * haiku_pricing['output']
+    
+    # Calculate coordinator costs
+    coordinator_pricing = CLAUDE_PER_TOKEN.get(coordinator_model, CLAUDE_PER_TOKEN['claude-3-5-sonnet-20241022'])
+    coordinator_input_cost = coordinator_input_tokens * coordinator_pricing['input']
+    coordinator_output_cost = coordinator_output_tokens * coordinator_pricing['output']
+    
+    total_cost = agent_input_cost + agent_output_cost + coordinator_input_cost + coordinator_output_cost
+    
+    return orjson.dumps({
+        'search_mode': 'multi_agent_web_search',
+        'estimated_tokens': {
+            'agent_input': agent_input_tokens,
+            'agent_output': agent_output_tokens,
+            'coordinator_input': coordinator_input_tokens,
+            'coordinator_output': coordinator_output_tokens,
+            'total_input': total_input_tokens,
+            'total_output': total_output_tokens,
+            'total': total_input_tokens + total_output_tokens
+        },
+        'costs': {
+            'agent_cost': round(agent_input_cost + agent_output_cost, 4),
+            'coordinator_cost': round(coordinator_input_cost + coordinator_output_cost, 4),
+            'total': round(total_cost, 4)
+        },
+        'agent_count': agent_count,
+        'coordinator_model': coordinator_model,
+        'agent_model': 'claude-3-5-haiku-20241022'
+    })
+
+@functools.lru_cache(maxsize=256)
+def estimate_traditional_cost_json(max_posts: int, model: str) -> bytes:
+    """Traditional Reddit search cost estimate, serialized as JSON"""
+    # Estimate token usage based on posts
+    # Rough estimates: each post ~300 tokens, each comment ~50 tokens, 5 comments per post
+    estimated_input_tokens = max_posts * (300 + 5 * 50) + 500  # +500 for prompt overhead
+    estimated_output_tokens = 400  # Typical summary length
+    
+    # Determine pricing based on model
+    if model.startswith('gemini-'):
+        pricing = GEMINI_PER_TOKEN.get(model, GEMINI_PER_TOKEN['gemini-1.5-flash'])
+        ai_provider = 'gemini'
+    else:
+        pricing = CLAUDE_PER_TOKEN.get(model, CLAUDE_PER_TOKEN['claude-3-5-sonnet-20241022'])
+        ai_provider = 'claude'
+    
+    input_cost = estimated_input_tokens * pricing['input']
+    output_cost = estimated_output_tokens * pricing['output']
+    total_cost = input_cost + output_cost
+    
+    # Reddit API is free for reasonable usage
+    reddit_cost = 0.0
+    
+    # Handle free tier for Gemini
+    if model == 'gemini-1.5-flash':
+        # Check if within free tier limits (simplified check)
+        total_cost = 0.0  # Assume free tier for cost estimation
+        input_cost = 0.0
+        output_cost = 0.0
+    
+    return orjson.dumps({
+        'search_mode': 'traditional_reddit_search',
+        'estimated_tokens': {
+            'input': estimated_input_tokens,
+            'output': estimated_output_tokens,
+            'total': estimated_input_tokens + estimated_output_tokens
+        },
+        'costs': {
+            'reddit_api': reddit_cost,
+            f'{ai_provider}_input': round(input_cost, 4),
+            f'{ai_provider}_output': round(output_cost, 4),
+            f'{ai_provider}_total': round(input_cost + output_cost, 4),
+            'total': round(total_cost + reddit_cost, 4)
+        },
+        'model': model,
+        'ai_provider': ai_provider,
+        'posts': max_posts
+    })
+
+@functools.lru_cache(maxsize=1)
+def get_anthropic_client():
+    """
+    Shared sync Claude client, so its connection pool is reused across requests.
+    Callers that run their own retry loop should use with_options(max_retries=0).
+    """
+    return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=60.0)
 
-def call_ai_model(model: str, prompt: str, max_tokens: int = 1500):
+def call_ai_model(model: str, prompt: str, max_tokens: int = 1500, max_retries: int = None):
     """
-    Universal function to call either Claude or Gemini based on model name
+    Universal function to call either Claude or Gemini based on model name.
+    max_retries overrides the Claude SDK's own retries; None keeps its default.
     """
     if model.startswith('gemini-'):
         # Use Gemini API
@@ -161,21 +368,150 @@ def call_ai_model(model: str, prompt: str, max_tokens: int = 1500):
             )
             return response.text
         except Exception as e:
-            raise Exception(f"Gemini API error: {str(e)}")
+            raise Exception(f"Gemini API error: {str(e)}") from e
     else:
         # Use Claude API
+        wait_for_rate_limit_capacity()
         try:
-            client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-            message = client.messages.create(
+            client = get_anthropic_client()
+            if max_retries is not None:
+                client = client.with_options(max_retries=max_retries)
+            raw = client.messages.with_raw_response.create(
                 model=model,
                 max_tokens=max_tokens,
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
             )
+            note_rate_limit_headers(raw.headers)
+            message = raw.parse()
             return message.content[0].text
         except Exception as e:
-            raise Exception(f"Claude API error: {str(e)}")
+            raise Exception(f"Claude API error: {str(e)}") from e
+
+# When Anthropic reports this few requests left in the current window, later
+# calls wait for the window to reset instead of running into a 429
+RATE_LIMIT_LOW_WATERMARK = 2
+_rate_limit_resume_at = 0.0  # time.monotonic() value, guarded by _rate_limit_lock
+_rate_limit_lock = threading.Lock()
+
+def seconds_until_reset(reset_value) -> float:
+    """Seconds from now until an RFC 3339 anthropic-ratelimit-*-reset timestamp, or None"""
+    try:
+        reset_at = datetime.fromisoformat(reset_value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def note_rate_limit_headers(headers):
+    """Remember when to resume if a successful response shows the request budget nearly spent"""
+    global _rate_limit_resume_at
+    try:
+        remaining = int(headers.get('anthropic-ratelimit-requests-remaining'))
+    except (TypeError, ValueError):
+        return
+    if remaining < RATE_LIMIT_LOW_WATERMARK:
+        wait = seconds_until_reset(headers.get('anthropic-ratelimit-requests-reset'))
+        if wait:
+            logger.info("⏳ %d Claude requests left in this window; pausing new calls for %.1fs", remaining, wait)
+            with _rate_limit_lock:
+                _rate_limit_resume_at = max(_rate_limit_resume_at, time.monotonic() + wait)
+
+def wait_for_rate_limit_capacity():
+    """Sleep until the rate-limit window noted by note_rate_limit_headers has reset"""
+    with _rate_limit_lock:
+        delay = _rate_limit_resume_at - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+# Longest wait a rate-limited request will sit through before retrying. Past
+# this the error is raised at once so the route can answer 429 instead.
+MAX_RATE_LIMIT_WAIT = 10.0
+
+def rate_limit_wait(error, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a rate-limited call: Anthropic's retry-after
+    or reset headers when present, otherwise exponential backoff. Both get a
+    little jitter so concurrent retries do not land together.
+    """
+    headers = getattr(getattr(error.__cause__ or error, 'response', None), 'headers', None) or {}
+    wait = None
+    try:
+        wait = float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        wait = (seconds_until_reset(headers.get('anthropic-ratelimit-requests-reset'))
+                or seconds_until_reset(headers.get('anthropic-ratelimit-tokens-reset')))
+    if wait is None:
+        return (2 ** attempt) + random.uniform(0, 1)
+    return wait + random.uniform(0, 0.25)
+
+def is_rate_limit_error(error) -> bool:
+    """True for Claude 429s and for Gemini/Claude errors that mention rate limits or quota"""
+    if isinstance(error.__cause__ or error, anthropic.RateLimitError):
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "quota" in message
+
+def call_ai_model_with_retries(model: str, prompt: str, max_tokens: int = 1500, max_retries: int = 3):
+    """
+    Call the model, retrying rate-limited attempts after the wait the API asks
+    for. SDK retries are turned off so this loop alone decides the attempts.
+    """
+    for attempt in range(max_retries):
+        try:
+            return call_ai_model(model, prompt, max_tokens, max_retries=0)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_retries - 1:
+                raise
+            
+            wait_time = rate_limit_wait(e, attempt)
+            if wait_time > MAX_RATE_LIMIT_WAIT:
+                raise
+            print(f"Rate limit hit, waiting {wait_time:.2f} seconds before retry {attempt + 1}/{max_retries}")
+            time.sleep(wait_time)
+
+def stream_ai_model(model: str, prompt: str, max_tokens: int = 1500, max_retries: int = 3):
+    """
+    Yield the model's reply as text chunks while it is generated. Rate-limited
+    attempts are retried only until the first chunk has been yielded.
+    """
+    for attempt in range(max_retries):
+        started = False
+        try:
+            if model.startswith('gemini-'):
+                gemini_model = genai.GenerativeModel(model)
+                response = gemini_model.generate_content(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        max_output_tokens=max_tokens,
+                        temperature=0.7,
+                    ),
+                    stream=True
+                )
+                for chunk in response:
+                    started = True
+                    yield chunk.text
+            else:
+                client = get_anthropic_client().with_options(max_retries=0)
+                with client.messages.stream(
+                    model=model,
+                    max_tokens=max_tokens,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                ) as stream:
+                    for text in stream.text_stream:
+                        started = True
+                        yield text
+            return
+        except Exception as e:
+            if started or not is_rate_limit_error(e) or attempt == max_retries - 1:
+                raise
+            wait_time = rate_limit_wait(e, attempt)
+            if wait_time > MAX_RATE_LIMIT_WAIT:
+                raise
+            print(f"Rate limit hit, waiting {wait_time:.2f} seconds before retry {attempt + 1}/{max_retries}")
+            time.sleep(wait_time)
 
 # Multi-Agent Web Search System
 
@@ -187,71 +523,259 @@ def get_user_tier(user_id=None):
     # TODO: Add subscription logic here later
     return 'free'
 
+# Every model the search endpoint accepts, in the order shown in error messages
+VALID_MODELS = (
+    'gemini-1.5-flash',
+    'gemini-1.5-pro',
+    'claude-3-5-haiku-20241022',
+    'claude-3-5-sonnet-20241022', 
+    'claude-3-opus-20240229'
+)
+_VALID_MODEL_SET = frozenset(VALID_MODELS)
+
+TIER_MODELS = MappingProxyType({
+    'anonymous': frozenset(['gemini-1.5-flash']),
+    'free': frozenset(['gemini-1.5-flash']),
+    'paid': _VALID_MODEL_SET,
+})
+
 def get_allowed_models(tier):
     """Get list of models allowed for each tier"""
-    if tier == 'anonymous' or tier == 'free':
-        return ['gemini-1.5-flash']
-    elif tier == 'paid':
-        return [
-            'gemini-1.5-flash', 
-            'gemini-1.5-pro',
-            'claude-3-5-haiku-20241022',
-            'claude-3-5-sonnet-20241022', 
-            'claude-3-opus-20240229'
-        ]
-    return []
+    allowed = TIER_MODELS.get(tier, frozenset())
+    return [model for model in VALID_MODELS if model in allowed]
 
 def is_model_allowed(model, tier):
     """Check if a model is allowed for the given user tier"""
-    return model in get_allowed_models(tier)
+    return model in TIER_MODELS.get(tier, ())
 
 def extract_subreddit_from_url(url: str) -> str:
     """Extract subreddit name from Reddit URL"""
-    if 'reddit.com/r/' in url:
-        try:
-            return url.split('/r/')[1].split('/')[0]
-        except IndexError:
-            return 'unknown'
-    return 'unknown'
-
-async def web_search_agent(client, query: str, agent_id: int, search_focus: str):
-    """
-    Enhanced agent that searches for Reddit posts AND fetches their actual content
-    """
-    print(f"🤖 Agent {agent_id} STARTING: Web search + content analysis with focus '{search_focus}'")
-    print(f"📝 Agent {agent_id} Query: '{query}'")
-    
-    try:
-        # Create a focused search query based on the agent's specialty
-        focused_query = f"{query} {search_focus} site:reddit.com"
-        print(f"🔍 Agent {agent_id} Focused query: '{focused_query}'")
-        
-        # Enhanced prompt for web search + fetch workflow
-        prompt_content = f"""You are a Reddit research specialist analyzing discussions about: "{query}"
+    match = _SUBREDDIT_RE.search(url)
+    return match.group(1) if match else 'unknown'
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+AGENT_MODEL = "claude-3-5-haiku-latest"
+AGENT_MAX_TOKENS = 3000
+AGENT_MAX_POSTS = 5  # Reddit URLs kept per agent
+AGENT_MODEL_MAX_OUTPUT_TOKENS = 8192
+
+# From this many agents on, all focuses go to Claude in a single request so the
+# shared instructions are prefilled once instead of once per agent
+BATCHED_AGENT_THRESHOLD = 3
+
+AGENT_EXTRA_HEADERS = {
+    "anthropic-beta": "web-search-2025-03-05,web-fetch-2025-09-10"  # Both tools
+}
+
+def agent_tools(focus_count: int = 1):
+    """Web search + fetch tool definitions, with tool budgets scaled by focus count"""
+    return [
+        {
+            "type": "web_search_20250305",
+            "name": "web_search",
+            "max_uses": 3 * focus_count
+        },
+        {
+            "type": "web_fetch_20250910",
+            "name": "web_fetch",
+            "max_uses": 5 * focus_count,  # Allow fetching multiple pages
+            "citations": {"enabled": True}
+        }
+    ]
 
-Your search focus: {search_focus}
+# Different search focuses for agents, assigned round-robin
+SEARCH_FOCUSES = (
+    "recent discussions 2024 2023",
+    "best recommendations highly upvoted",
+    "detailed reviews comparison",
+    "community consensus popular",
+    "expert opinions detailed analysis"
+)
+
+@dataclass(slots=True, frozen=True)
+class RedditPost:
+    """A Reddit thread reported by a web search agent"""
+    url: str
+    title: str
+    summary: str
+    subreddit: str
+    relevance_score: int
+    estimated_engagement: str
+
+def reddit_post_from_url(url: str) -> RedditPost:
+    """Build an agent post record from the basic info in a Reddit URL"""
+    subreddit = extract_subreddit_from_url(url)
+    return RedditPost(
+        url=url,
+        title=f"Reddit post from r/{subreddit}",
+        summary="Post found via web search",
+        subreddit=subreddit,
+        relevance_score=7,
+        estimated_engagement='medium'
+    )
+
+# Agent results keyed on (normalized query, search focus, model). Repeat
+# searches for the same product skip the Claude call entirely.
+AGENT_CACHE = TTLCache(maxsize=512, ttl=3600)
+
+def normalize_query(query: str) -> str:
+    """Collapse case and whitespace so trivially different queries share cache entries"""
+    return _WHITESPACE_RE.sub(' ', query.strip().lower())
+
+# Static instructions for the web search agents. Sent as a cached system block;
+# AGENT_MODEL is Haiku, whose minimum cacheable prefix is 2048 tokens (1024 for
+# Sonnet/Opus), so this text must stay above that or cache_control is silently
+# ignored. Check usage.cache_creation_input_tokens after editing it, and keep
+# per-request values such as the query and search focus out of this text.
+AGENT_SYSTEM_PROMPT = """You are a Reddit research specialist. Each request gives you a user query and a search focus. Your job is to find real Reddit discussions about the query, read them, and report what the communities actually say, with emphasis on the search focus.
 
 COMPREHENSIVE RESEARCH WORKFLOW:
-1. SEARCH PHASE: Use web_search to find relevant Reddit discussions about "{query} {search_focus} site:reddit.com"
-2. FETCH PHASE: Use web_fetch to access the actual content of the most relevant Reddit posts you find
-3. ANALYSIS PHASE: Analyze the full discussions, comments, and community insights
+1. SEARCH PHASE: Use web_search to find relevant Reddit discussions. Build your search as "<query> <search focus> site:reddit.com" and refine it if the first results are off-topic, outdated, or not on reddit.com.
+2. FETCH PHASE: Use web_fetch to access the actual content of the most relevant Reddit posts you find.
+3. ANALYSIS PHASE: Analyze the full discussions, comments, and community insights.
 
-Your specific focus: {search_focus}
+TOOL USAGE RULES:
+- Prefer reddit.com thread URLs of the form https://www.reddit.com/r/<subreddit>/comments/<post_id>/<slug>/ over subreddit front pages, user profiles, or wiki pages.
+- Skip search results that are not Reddit threads unless no Reddit threads exist for the query.
+- Do not fetch the same thread twice. If a fetch fails or returns a removed post, move on to the next candidate instead of retrying.
+- Favour threads with visible engagement (many comments, high upvotes) and threads from subreddits dedicated to the topic.
+- When the focus mentions recency, prefer threads from the last one to two years and say so when only older threads exist.
 
 DETAILED INSTRUCTIONS:
-- Search for Reddit posts that match your focus area: {search_focus}
+- Search for Reddit posts that match your focus area
 - Access the actual content of the most promising posts (up to 3-4 posts)
 - Read through post content, top comments, and community discussions
 - Extract specific recommendations, product mentions, prices, and consensus
 - Identify patterns in community sentiment and advice
+- Distinguish between a single enthusiastic commenter and a view shared by many commenters
+- Note when top-voted replies disagree with the original post
 
 ANALYSIS GOALS:
-- Find concrete recommendations related to "{query}"
+- Find concrete recommendations related to the query
 - Extract specific product/brand names and prices mentioned
 - Identify community consensus and popular opinions
 - Note any warnings or common concerns raised
 - Capture the overall sentiment and confidence level of recommendations
 
+SEARCH QUERY CONSTRUCTION:
+- Start with the most natural phrasing a Reddit user would use in a thread title, for example "best budget mechanical keyboard" rather than "mechanical keyboard recommendations low price range".
+- Add the search focus as one or two plain keywords (for example "durability", "beginner", "vs", "worth it", "long term review") instead of a full sentence.
+- If the first search returns few Reddit threads, try a synonym for the product category, drop adjectives, or search for a well known brand in the category together with the focus.
+- If the query names a specific product, also search for "<product> review reddit" and "<product> problems reddit" so both praise and complaints are represented.
+- If the query is a comparison between two products, search for "<product A> vs <product B>" as well as each product on its own.
+- Limit yourself to a small number of searches. Stop searching once you have three or four strong threads that match the focus.
+
+CHOOSING WHICH THREADS TO READ:
+- Read the snippet and title before fetching. Prefer threads whose title asks the same question as the user query.
+- Prefer recommendation threads, comparison threads, buying advice threads, and long term ownership reports over news posts, memes, or giveaway posts.
+- Prefer threads with many comments over threads with a single reply, even when the single reply looks relevant.
+- Prefer a mix of subreddits when possible, for example one topic-specific subreddit and one general buying advice subreddit, so the findings are not dominated by one community.
+- Avoid megathreads and weekly discussion threads unless nothing else exists; they are long and rarely focused on the query.
+- Avoid threads that are locked, archived with no replies, or obviously promotional.
+
+READING A THREAD:
+- Read the original post first to understand the asker's budget, use case, and constraints. Recommendations only make sense relative to those constraints.
+- Read the top level comments in the order Reddit shows them, which roughly follows votes. The first few top level comments usually carry the community consensus.
+- Pay attention to replies that correct or push back on a top comment; they often contain the most useful warnings.
+- Note when the original poster later reports what they bought or how it worked out. Follow-up edits are strong evidence.
+- Ignore jokes, off-topic tangents, and comments that only say "this" or repeat another comment.
+- Keep track of which thread each claim came from, so every recommendation in your summary can be traced to a source URL.
+
+PRODUCTS, BRANDS AND PRICES:
+- Record product names exactly as commenters write them, including model numbers and generations, since similar names often refer to different products.
+- Record prices with their currency and, when mentioned, whether the price was a sale, a used price, or a regular retail price.
+- When commenters mention a price range rather than a single price, keep the range.
+- If prices differ between threads, report the range and note that prices change over time.
+- Note when a product is repeatedly described as discontinued, hard to find, or replaced by a newer model.
+- Count how many distinct commenters recommend each product. A product praised by five different people is a stronger recommendation than one praised five times by the same person.
+
+SENTIMENT AND CONSENSUS:
+- Describe consensus in plain words: strong consensus, mixed opinions, or no clear consensus.
+- When opinions are mixed, describe the main camps and what each camp values, for example price versus build quality.
+- Report common complaints and failure modes separately from recommendations, since users often ask specifically about problems.
+- Do not turn a single negative anecdote into a general warning, and do not ignore a complaint that many commenters repeat.
+
+HANDLING DIFFERENT KINDS OF QUERIES:
+- Product category queries (for example "best wireless earbuds"): look for recommendation threads, collect the products most often recommended, and group them by budget or use case when the threads do.
+- Specific product queries (for example a single model name): look for ownership reports, reviews, and complaint threads, and report strengths, weaknesses, and common defects.
+- Comparison queries (for example "product A vs product B"): report which product each community prefers, for which use cases, and the deciding factors commenters mention.
+- Service or subscription queries: look for cancellation experiences, pricing changes, customer support stories, and alternatives people switched to.
+- How-to or advice queries: report the approaches commenters recommend, the most common mistakes they warn about, and any tools or products they mention along the way.
+- Location specific queries: prefer city, regional, or country subreddits, and note that advice may not apply elsewhere.
+
+WHEN RESULTS ARE LIMITED:
+- If only one or two relevant threads exist, analyze them thoroughly and state clearly that coverage was thin.
+- If the only threads are several years old, still report them, mark the findings as dated, and mention that newer products may exist.
+- If Reddit discussions exist but do not address the search focus, summarize what they do say and state that the focus itself was not discussed.
+- If a fetch returns an error, an empty page, or a login wall, use the search snippet only for deciding relevance and do not quote it as thread content.
+- Never pad the summary with general knowledge that did not come from the threads. It is better to return a short accurate summary than a long speculative one.
+
+WRITING STYLE:
+- Write in clear, neutral English for a reader who wants to make a decision quickly.
+- Use short bullet points under each heading and keep each bullet to one or two sentences.
+- Attribute opinions to the community ("commenters on r/<subreddit> say") rather than presenting them as facts.
+- Quote short phrases from comments only when the exact wording matters, and keep quotes brief.
+- Do not include usernames, personal details, or links other than the thread URLs in the Sources section.
+- Do not add a closing note, disclaimer, or offer of further help after the Sources section.
+
+EXAMPLE OF A GOOD SUMMARY (for the query "best running shoes for flat feet" with the focus "beginner"):
+
+Key Findings
+Beginners with flat feet on r/running and r/RunningShoeGeeks are mostly steered toward stability shoes, with several commenters stressing a gait analysis at a running store before buying.
+
+Recommendations
+- Brooks Adrenaline GTS is the most frequently recommended beginner stability shoe across both threads.
+- ASICS Kayano is suggested by several commenters for heavier runners, though some find it stiff.
+
+Products and Prices
+- Brooks Adrenaline GTS: around $140 retail, older versions often discounted.
+- ASICS Kayano: around $160 retail.
+
+Community Sentiment
+Strong consensus that flat-footed beginners should try stability shoes first, with mixed opinions on whether insoles are needed.
+
+Sources
+https://www.reddit.com/r/running/comments/<post_id>/<slug>/
+https://www.reddit.com/r/RunningShoeGeeks/comments/<post_id>/<slug>/
+
+The example above only shows the expected structure and level of detail. Its products, prices, and URLs are illustrative; never copy them into a real answer, and only report what the threads you actually read contain.
+
+SOURCE QUALITY GUIDELINES:
+- Treat highly upvoted comments from long discussions as stronger evidence than lone replies.
+- Treat posts from topic-specific subreddits as stronger evidence than general subreddits.
+- Be explicit about affiliate links, self-promotion, or brand accounts when you notice them.
+- Do not invent posts, quotes, usernames, prices, or vote counts. If the discussions you read do not cover something, say that it was not covered.
+- If you cannot find relevant Reddit content at all, say so plainly and describe what you searched for.
+
+OUTPUT FORMAT:
 After your research, provide a detailed summary including:
 - Key findings from the Reddit discussions you accessed
 - Specific recommendations with context from the communities
@@ -260,97 +784,154 @@ After your research, provide a detailed summary including:
 - Overall community sentiment and consensus level
 - Citations to the specific posts you analyzed
 
-Focus on providing actionable insights from real Reddit discussions about "{query}" with emphasis on {search_focus}."""
+Write the summary as short sections with plain headings, in this order: Key Findings, Recommendations, Products and Prices, Community Sentiment, Sources. Under Sources, list every Reddit thread you analyzed as its full URL on its own line, in the form https://www.reddit.com/r/<subreddit>/comments/<post_id>/<slug>/, so the URLs can be parsed automatically. Do not shorten, redact, or wrap these URLs in markdown link syntax.
+
+Focus on providing actionable insights from real Reddit discussions about the query, with emphasis on the search focus."""
+
+# Fixed tail of the batched agent user turn, appended after the query and focuses
+BATCHED_AGENT_INSTRUCTIONS = (
+    "\n\nResearch the query once for each focus. Instead of the usual summary format, "
+    "answer with a single ```json code block containing a JSON array with one object per focus, "
+    "in the same order as the focuses, each shaped like "
+    '{"focus": "<focus>", "summary": "<detailed summary for this focus>", '
+    '"reddit_urls": ["<full reddit thread URL>", ...]}.'
+)
+
+# Static instructions for the coordinator agent, sent as the system block. It is
+# well under the 1024-token cache minimum for Sonnet/Opus, so it is not marked
+# for prompt caching. The query and the agent findings go in the user turn.
+COORDINATOR_SYSTEM_PROMPT = """You are the coordinator agent responsible for synthesizing findings from multiple web search agents. Each request contains the user's query, a search summary, and the findings reported by every agent (including failed agents).
+
+CRITICAL ANALYSIS REQUIRED:
+Based on the agent findings, provide a comprehensive analysis that includes:
+
+1. **SEARCH EFFECTIVENESS**: How well did the agents perform? Were they able to find relevant Reddit content?
+
+2. **REDDIT CONTENT ANALYSIS**: Analyze the quality and relevance of Reddit posts found
+   - Extract key themes and recommendations
+   - Identify most valuable discussions
+   - Note community consensus where present
+
+3. **RECOMMENDATIONS**: Based on the Reddit discussions found, what are the top recommendations for the user's query?
+
+4. **LIMITATIONS**: What limitations exist in this search (failed agents, lack of results, etc.)?
+
+5. **CONFIDENCE LEVEL**: How confident are you in these recommendations given the available data?
+
+If agents failed to find meaningful Reddit content, clearly state this and explain why the search was ineffective.
+
+Please provide a thorough analysis even if the search results were limited."""
+
+def log_cache_usage(label: str, message):
+    """Log prompt cache writes and reads; both stay at zero when the cached prefix is too short"""
+    usage = getattr(message, "usage", None)
+    if usage is not None:
+        logger.debug("💾 %s cache: %s tokens written, %s tokens read", label,
+                     getattr(usage, "cache_creation_input_tokens", None),
+                     getattr(usage, "cache_read_input_tokens", None))
+
+async def web_search_agent(client, query: str, agent_id: int, search_focus: str):
+    """
+    Enhanced agent that searches for Reddit posts AND fetches their actual content
+    """
+    logger.debug("🤖 Agent %d STARTING: Web search + content analysis with focus '%s'", agent_id, search_focus)
+    logger.debug("📝 Agent %d Query: '%s'", agent_id, query)
+    
+    cache_key = (normalize_query(query), search_focus, AGENT_MODEL)
+    cached = AGENT_CACHE.get(cache_key)
+    if cached is not None:
+        logger.debug("♻️ Agent %d Cache hit - reusing previous results", agent_id)
+        return {
+            "agent_id": agent_id,
+            "search_focus": search_focus,
+            "response": cached["response"],
+            "parsed_data": {**cached["parsed_data"], "agent_id": agent_id},
+            "success": True,
+            "cached": True
+        }
+    
+    try:
+        # Only the query and focus vary per agent; the workflow instructions live in
+        # the cached system block so repeat agents pay cached-input rates
+        prompt_content = f"Query: {query}\nFocus: {search_focus}"
 
-        print(f"📤 Agent {agent_id} Sending request to Claude with web search + fetch tools...")
-        print(f"🔧 Agent {agent_id} Using model: claude-3-5-haiku-latest")
-        print(f"🎯 Agent {agent_id} Max tokens: 3000")
+        logger.debug("📤 Agent %d Sending request to %s with web search + fetch tools (max tokens %d)",
+                     agent_id, AGENT_MODEL, AGENT_MAX_TOKENS)
         
-        message = await asyncio.to_thread(
-            client.messages.create,
-            model="claude-3-5-haiku-latest",
-            max_tokens=3000,  # Increased for content analysis
+        response_text = ""
+        reddit_posts = []
+        scan_pos = 0
+        
+        def collect_urls(final: bool):
+            """Turn newly streamed Reddit URLs into posts; returns True once enough were found"""
+            nonlocal scan_pos
+            for match in _REDDIT_URL_RE.finditer(response_text, scan_pos):
+                # A URL touching the end of the buffer may still be growing
+                if not final and match.end() == len(response_text):
+                    break
+                scan_pos = match.end()
+                reddit_posts.append(reddit_post_from_url(match.group(0)))
+                logger.debug("🎯 Agent %d Added Reddit post: %s", agent_id, match.group(0))
+                if len(reddit_posts) >= AGENT_MAX_POSTS:
+                    return True
+            return False
+        
+        # Stream the answer and pick up URLs as they arrive, stopping early once
+        # the agent has found as many posts as the coordinator will use
+        async with client.messages.stream(
+            model=AGENT_MODEL,
+            max_tokens=AGENT_MAX_TOKENS,  # Increased for content analysis
+            system=[{
+                "type": "text",
+                "text": AGENT_SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }],
             messages=[{
                 "role": "user", 
                 "content": prompt_content
             }],
-            tools=[
-                {
-                    "type": "web_search_20250305",
-                    "name": "web_search",
-                    "max_uses": 3
-                },
-                {
-                    "type": "web_fetch_20250910",  # Add web fetch tool
-                    "name": "web_fetch", 
-                    "max_uses": 5,  # Allow fetching multiple pages
-                    "citations": {"enabled": True}
-                }
-            ],
-            extra_headers={
-                "anthropic-beta": "web-search-2025-03-05,web-fetch-2025-09-10"  # Both tools
-            }
-        )
+            tools=agent_tools(),
+            extra_headers=AGENT_EXTRA_HEADERS
+        ) as stream:
+            enough_posts = False
+            async for text in stream.text_stream:
+                response_text += text
+                if collect_urls(final=False):
+                    enough_posts = True
+                    logger.debug("⏹️ Agent %d Found %d posts - stopping stream early", agent_id, len(reddit_posts))
+                    break
+            message = stream.current_message_snapshot
+        log_cache_usage(f"Agent {agent_id}", message)
         
-        print(f"✅ Agent {agent_id} Received response from Claude")
-        print(f"📊 Agent {agent_id} Response type: {type(message)}")
-        print(f"📏 Agent {agent_id} Response content length: {len(message.content) if message.content else 0}")
+        if not enough_posts:
+            collect_urls(final=True)
         
-        # Handle Claude response with tool use and text
-        response_text = ""
-        reddit_posts = []
+        logger.debug("✅ Agent %d Received response from Claude (%d content blocks)",
+                     agent_id, len(message.content) if message.content else 0)
         
-        if message.content:
+        if message.content and logger.isEnabledFor(logging.DEBUG):
             for content_block in message.content:
-                if content_block.type == "text":
-                    response_text += content_block.text
-                    print(f"� Agent {agent_id} Text response: {content_block.text[:200]}...")
-                elif content_block.type == "tool_use":
-                    print(f"🔧 Agent {agent_id} Tool use detected: {content_block.name}")
-                    if content_block.name == "web_search":
-                        print(f"🔍 Agent {agent_id} Web search tool executed")
-                    elif content_block.name == "web_fetch":
-                        print(f"📄 Agent {agent_id} Web fetch tool executed")
+                if content_block.type == "tool_use":
+                    logger.debug("🔧 Agent %d Tool use detected: %s", agent_id, content_block.name)
+                    if content_block.name == "web_fetch":
                         # Log fetch details for Reddit URLs
                         if hasattr(content_block, 'input') and content_block.input:
                             fetch_url = content_block.input.get('url', '')
                             if 'reddit.com' in fetch_url:
-                                print(f"📄 Agent {agent_id} Fetching Reddit URL: {fetch_url}")
-                        # The actual search results will be in the tool_result block
-                        # For now, we'll process the text response that follows
-        
-        # Look for tool results in subsequent messages if needed
-        # For now, parse any Reddit URLs found in the text response
-        if response_text:
-            import re
-            reddit_urls = re.findall(r'https?://(?:www\.)?reddit\.com/r/\w+/comments/[\w/]+', response_text)
-            print(f"� Agent {agent_id} Found {len(reddit_urls)} Reddit URLs in response")
-            
-            for url in reddit_urls[:5]:  # Limit to 5 URLs per agent
-                # Extract basic info from URL structure
-                subreddit = extract_subreddit_from_url(url)
-                reddit_posts.append({
-                    'url': url,
-                    'title': f"Reddit post from r/{subreddit}",
-                    'summary': "Post found via web search",
-                    'subreddit': subreddit,
-                    'relevance_score': 7,
-                    'estimated_engagement': 'medium'
-                })
-                print(f"🎯 Agent {agent_id} Added Reddit post: {url}")
+                                logger.debug("📄 Agent %d Fetching Reddit URL: %s", agent_id, fetch_url)
         
         # Add fallback error handling if no results found
         if len(reddit_posts) == 0:
-            print(f"⚠️ Agent {agent_id} No Reddit posts found - debugging response structure")
-            if message.content:
+            logger.warning("⚠️ Agent %d No Reddit posts found", agent_id)
+            if message.content and logger.isEnabledFor(logging.DEBUG):
                 for i, block in enumerate(message.content):
-                    print(f"   Block {i}: type={block.type}")
+                    logger.debug("   Block %d: type=%s", i, block.type)
                     if hasattr(block, 'text'):
-                        print(f"   Text content: {block.text[:100]}...")
+                        logger.debug("   Text content: %.100s...", block.text)
                     if hasattr(block, 'name'):
-                        print(f"   Tool name: {block.name}")
+                        logger.debug("   Tool name: %s", block.name)
                     if hasattr(block, 'input'):
-                        print(f"   Tool input: {block.input}")
+                        logger.debug("   Tool input: %s", block.input)
             
             # Still return a valid result even if no posts found
             result_data = {
@@ -376,10 +957,11 @@ Focus on providing actionable insights from real Reddit discussions about "{quer
                 "response_text": response_text[:500] if response_text else "No text response"
             }
         
-        print(f"🎯 Agent {agent_id} COMPLETED successfully")
-        print(f"📊 Agent {agent_id} Final result - Found {len(reddit_posts)} Reddit posts")
-        for post in reddit_posts:
-            print(f"   📌 {post['title'][:60]}... ({post['url']})")
+        logger.info("🎯 Agent %d COMPLETED - Found %d Reddit posts", agent_id, len(reddit_posts))
+        
+        # Only cache runs that found something; empty results may be transient
+        if reddit_posts:
+            AGENT_CACHE.put(cache_key, {"response": response_text, "parsed_data": result_data})
         
         return {
             "agent_id": agent_id,
@@ -390,9 +972,7 @@ Focus on providing actionable insights from real Reddit discussions about "{quer
         }
         
     except Exception as e:
-        print(f"❌ Agent {agent_id} FAILED with exception: {type(e).__name__}: {e}")
-        import traceback
-        print(f"📍 Agent {agent_id} Traceback: {traceback.format_exc()}")
+        logger.exception("❌ Agent %d FAILED with exception: %s: %s", agent_id, type(e).__name__, e)
         return {
             "agent_id": agent_id,
             "search_focus": search_focus,
@@ -401,58 +981,185 @@ Focus on providing actionable insights from real Reddit discussions about "{quer
             "success": False
         }
 
+def parse_batched_agent_response(response_text: str):
+    """Extract the JSON array of per-focus findings from a batched agent response"""
+    match = _BATCHED_JSON_RE.search(response_text)
+    if match:
+        json_str = match.group(1)
+    else:
+        start, end = response_text.find('['), response_text.rfind(']')
+        if start == -1 or end <= start:
+            return None
+        json_str = response_text[start:end + 1]
+    try:
+        data = json.loads(json_str)
+    except ValueError:
+        return None
+    return data if isinstance(data, list) else None
+
+async def batched_web_search_agent(client, query: str, search_focuses: list):
+    """
+    Run every agent focus through a single Claude request and fan the answer back
+    out into one result per agent, in the same shape web_search_agent returns
+    """
+    agent_ids = list(range(1, len(search_focuses) + 1))
+    results = [None] * len(search_focuses)
+    
+    # Serve cached focuses directly and only batch the rest
+    pending = []
+    for index, (agent_id, focus) in enumerate(zip(agent_ids, search_focuses)):
+        cached = AGENT_CACHE.get((normalize_query(query), focus, AGENT_MODEL))
+        if cached is not None:
+            logger.debug("♻️ Agent %d Cache hit - reusing previous results", agent_id)
+            results[index] = {
+                "agent_id": agent_id,
+                "search_focus": focus,
+                "response": cached["response"],
+                "parsed_data": {**cached["parsed_data"], "agent_id": agent_id},
+                "success": True,
+                "cached": True
+            }
+        else:
+            pending.append(index)
+    
+    if not pending:
+        return results
+    
+    pending_focuses = [search_focuses[i] for i in pending]
+    logger.debug("📦 Batching %d agent focuses into one request: %s", len(pending_focuses), pending_focuses)
+    
+    prompt_content = f"Query: {query}\nFocuses: {json.dumps(pending_focuses)}{BATCHED_AGENT_INSTRUCTIONS}"
+    
+    try:
+        message = await client.messages.create(
+            model=AGENT_MODEL,
+            max_tokens=min(AGENT_MAX_TOKENS * len(pending_focuses), AGENT_MODEL_MAX_OUTPUT_TOKENS),
+            system=[{
+                "type": "text",
+                "text": AGENT_SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }],
+            messages=[{
+                "role": "user",
+                "content": prompt_content
+            }],
+            tools=agent_tools(len(pending_focuses)),
+            extra_headers=AGENT_EXTRA_HEADERS
+        )
+        log_cache_usage("Batched agent", message)
+        
+    except Exception as e:
+        # Retrying per focus would only send more calls against the same rate
+        # limit or overloaded API, so report every pending focus as failed
+        logger.error("❌ Batched agent request failed: %s: %s", type(e).__name__, e)
+        for index in pending:
+            results[index] = {
+                "agent_id": agent_ids[index],
+                "search_focus": search_focuses[index],
+                "error": str(e),
+                "error_type": type(e).__name__,
+                "success": False
+            }
+        return results
+    
+    response_text = "".join(
+        block.text for block in (message.content or []) if block.type == "text"
+    )
+    findings = parse_batched_agent_response(response_text)
+    
+    if findings is None:
+        # Fall back to one request per focus rather than losing every agent
+        logger.warning("⚠️ Batched response unusable - running %d agents individually", len(pending))
+        fallback = await asyncio.gather(
+            *(web_search_agent(client, query, agent_ids[i], search_focuses[i]) for i in pending),
+            return_exceptions=True
+        )
+        for index, result in zip(pending, fallback):
+            results[index] = result
+        return results
+    
+    for position, index in enumerate(pending):
+        agent_id, focus = agent_ids[index], search_focuses[index]
+        finding = findings[position] if position < len(findings) and isinstance(findings[position], dict) else {}
+        # The model may write null (or another non-string/non-list) for a focus with no hits
+        summary = finding.get("summary")
+        summary = summary if isinstance(summary, str) else ""
+        raw_urls = finding.get("reddit_urls")
+        urls = [
+            url for url in (raw_urls if isinstance(raw_urls, list) else [])
+            if isinstance(url, str) and _REDDIT_URL_RE.match(url)
+        ]
+        
+        reddit_posts = [reddit_post_from_url(url) for url in urls[:AGENT_MAX_POSTS]]
+        logger.info("🎯 Agent %d (batched) found %d Reddit posts", agent_id, len(reddit_posts))
+        
+        result_data = {
+            "agent_id": agent_id,
+            "search_focus": focus,
+            "reddit_posts": reddit_posts,
+            "search_strategy": (
+                f"Used batched web search to find Reddit posts about '{query}' with focus on {focus}"
+                if reddit_posts else
+                f"Batched web search attempted for '{query}' with focus '{focus}' but no Reddit posts found"
+            ),
+            "total_posts_found": len(reddit_posts),
+            "response_text": summary[:500] if summary else "No text response"
+        }
+        if reddit_posts:
+            AGENT_CACHE.put((normalize_query(query), focus, AGENT_MODEL), {"response": summary, "parsed_data": result_data})
+        
+        results[index] = {
+            "agent_id": agent_id,
+            "search_focus": focus,
+            "response": summary,
+            "parsed_data": result_data,
+            "success": True
+        }
+    
+    return results
+
 async def multi_agent_web_search(query: str, agent_count: int = 3):
     """
     Deploy multiple Haiku agents to search the web in parallel
     """
-    print(f"🚀 MULTI-AGENT SEARCH STARTING")
-    print(f"📝 Query: '{query}'")
-    print(f"🤖 Agent count: {agent_count}")
-    print(f"⏰ Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    # Define different search focuses for agents
-    search_focuses = [
-        "recent discussions 2024 2023",
-        "best recommendations highly upvoted",
-        "detailed reviews comparison",
-        "community consensus popular",
-        "expert opinions detailed analysis"
-    ]
-    
-    print(f"🎯 Available search focuses: {search_focuses}")
+    logger.info("🚀 MULTI-AGENT SEARCH STARTING: '%s' with %d agents", query, agent_count)
     
     try:
-        client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        print(f"✅ Anthropic client initialized successfully")
+        client = await get_async_anthropic_client()
     except Exception as e:
-        print(f"❌ Failed to initialize Anthropic client: {e}")
+        logger.error("❌ Failed to initialize Anthropic client: %s", e)
         return {
             "agent_results": [],
             "success_rate": 0,
             "error": f"Client initialization failed: {e}"
         }
     
-    # Create tasks for parallel execution
-    tasks = []
-    print(f"🏗️ Creating agent tasks...")
-    for i in range(agent_count):
-        focus = search_focuses[i % len(search_focuses)]
-        print(f"📋 Agent {i+1}: Focus = '{focus}'")
-        task = web_search_agent(client, query, i+1, focus)
-        tasks.append(task)
+    agent_focuses = [SEARCH_FOCUSES[i % len(SEARCH_FOCUSES)] for i in range(agent_count)]
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, focus in enumerate(agent_focuses):
+            logger.debug("📋 Agent %d: Focus = '%s'", i+1, focus)
     
-    print(f"⚡ LAUNCHING {len(tasks)} agents in parallel...")
     start_time = datetime.now()
     
     try:
-        # Execute all agents in parallel
-        agent_results = await asyncio.gather(*tasks, return_exceptions=True)
+        if agent_count >= BATCHED_AGENT_THRESHOLD:
+            # One request covering every focus
+            logger.debug("⚡ LAUNCHING %d agents as one batched request...", agent_count)
+            agent_results = await batched_web_search_agent(client, query, agent_focuses)
+        else:
+            # Execute all agents in parallel
+            logger.debug("⚡ LAUNCHING %d agents in parallel...", agent_count)
+            tasks = [
+                web_search_agent(client, query, i+1, focus)
+                for i, focus in enumerate(agent_focuses)
+            ]
+            agent_results = await asyncio.gather(*tasks, return_exceptions=True)
         
         execution_time = (datetime.now() - start_time).total_seconds()
-        print(f"⏱️ All agents completed in {execution_time:.2f} seconds")
+        logger.debug("⏱️ All agents completed in %.2f seconds", execution_time)
         
     except Exception as e:
-        print(f"❌ Error during parallel execution: {e}")
+        logger.error("❌ Error during parallel execution: %s", e)
         return {
             "agent_results": [],
             "success_rate": 0,
@@ -460,17 +1167,14 @@ async def multi_agent_web_search(query: str, agent_count: int = 3):
         }
     
     # Process results with detailed logging
-    print(f"📊 PROCESSING AGENT RESULTS")
     successful_results = []
     failed_results = []
     total_reddit_posts = 0
     
     for i, result in enumerate(agent_results):
         agent_num = i + 1
-        print(f"\n--- Agent {agent_num} Result Analysis ---")
-        
         if isinstance(result, Exception):
-            print(f"❌ Agent {agent_num}: Exception occurred: {result}")
+            logger.error("❌ Agent %d: Exception occurred: %s", agent_num, result)
             failed_results.append({
                 "agent_id": agent_num,
                 "error": str(result),
@@ -478,27 +1182,22 @@ async def multi_agent_web_search(query: str, agent_count: int = 3):
             })
         elif isinstance(result, dict):
             if result.get("success", False):
-                print(f"✅ Agent {agent_num}: SUCCESS")
                 parsed_data = result.get("parsed_data", {})
                 reddit_posts = parsed_data.get("reddit_posts", [])
-                print(f"📊 Agent {agent_num}: Found {len(reddit_posts)} Reddit posts")
+                logger.debug("✅ Agent %d: SUCCESS - Found %d Reddit posts", agent_num, len(reddit_posts))
                 
-                if reddit_posts:
+                if reddit_posts and logger.isEnabledFor(logging.DEBUG):
                     for j, post in enumerate(reddit_posts):
-                        print(f"   📌 Post {j+1}: {post.get('title', 'No title')[:50]}...")
-                        print(f"      🔗 URL: {post.get('url', 'No URL')}")
-                        print(f"      📍 Subreddit: r/{post.get('subreddit', 'unknown')}")
+                        logger.debug("   📌 Post %d: %.50s... (r/%s) %s", j+1, post.title, post.subreddit, post.url)
                         
                 total_reddit_posts += len(reddit_posts)
                 successful_results.append(result)
             else:
-                print(f"❌ Agent {agent_num}: FAILED")
-                error_msg = result.get("error", "Unknown error")
-                error_type = result.get("error_type", "Unknown")
-                print(f"   💥 Error: {error_type}: {error_msg}")
+                logger.error("❌ Agent %d: FAILED - %s: %s", agent_num,
+                             result.get("error_type", "Unknown"), result.get("error", "Unknown error"))
                 failed_results.append(result)
         else:
-            print(f"❌ Agent {agent_num}: Invalid result type: {type(result)}")
+            logger.error("❌ Agent %d: Invalid result type: %s", agent_num, type(result))
             failed_results.append({
                 "agent_id": agent_num,
                 "error": f"Invalid result type: {type(result)}",
@@ -507,12 +1206,8 @@ async def multi_agent_web_search(query: str, agent_count: int = 3):
     
     success_rate = len(successful_results) / len(agent_results) if agent_results else 0
     
-    print(f"\n🎯 MULTI-AGENT SEARCH SUMMARY")
-    print(f"✅ Successful agents: {len(successful_results)}/{len(agent_results)}")
-    print(f"❌ Failed agents: {len(failed_results)}/{len(agent_results)}")
-    print(f"📊 Success rate: {success_rate*100:.1f}%")
-    print(f"🔗 Total Reddit posts found: {total_reddit_posts}")
-    print(f"⏱️ Total execution time: {execution_time:.2f}s")
+    logger.info("🎯 MULTI-AGENT SEARCH SUMMARY: %d/%d agents succeeded (%.1f%%), %d Reddit posts, %.2fs",
+                len(successful_results), len(agent_results), success_rate*100, total_reddit_posts, execution_time)
     
     return {
         "agent_results": agent_results,
@@ -522,41 +1217,19 @@ async def multi_agent_web_search(query: str, agent_count: int = 3):
         "total_reddit_posts": total_reddit_posts,
         "execution_time": execution_time
     }
-    
-    for result in agent_results:
-        if isinstance(result, Exception):
-            failed_results.append({"error": str(result)})
-        elif result.get("success"):
-            successful_results.append(result)
-        else:
-            failed_results.append(result)
-    
-    print(f"📊 Agent Results: {len(successful_results)} succeeded, {len(failed_results)} failed")
-    
-    return {
-        "successful_agents": successful_results,
-        "failed_agents": failed_results,
-        "total_agents": agent_count,
-        "success_rate": len(successful_results) / agent_count
-    }
 
 async def coordinate_agent_results(agent_results: dict, query: str, coordinator_model: str):
     """
     Use a Sonnet/Opus agent to synthesize all agent findings
     """
-    print(f"\n🧠 COORDINATOR STARTING")
-    print(f"🤖 Model: {coordinator_model}")
-    print(f"📝 Query: '{query}'")
-    print(f"📊 Processing results from {len(agent_results.get('agent_results', []))} agents")
-    
     successful_agents = agent_results.get("successful_results", [])
     failed_agents = agent_results.get("failed_results", [])
     
-    print(f"✅ Successful agents: {len(successful_agents)}")
-    print(f"❌ Failed agents: {len(failed_agents)}")
+    logger.info("🧠 COORDINATOR STARTING: %s on '%s' (%d successful, %d failed agents)",
+                coordinator_model, query, len(successful_agents), len(failed_agents))
     
     if not successful_agents:
-        print(f"💥 No successful agents - cannot coordinate results")
+        logger.error("💥 No successful agents - cannot coordinate results")
         return {
             "success": False,
             "error": "No successful agents to coordinate",
@@ -568,10 +1241,9 @@ async def coordinate_agent_results(agent_results: dict, query: str, coordinator_
         }
     
     try:
-        client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        print(f"✅ Anthropic client initialized for coordinator")
+        client = await get_async_anthropic_client()
     except Exception as e:
-        print(f"❌ Failed to initialize coordinator client: {e}")
+        logger.error("❌ Failed to initialize coordinator client: %s", e)
         return {
             "success": False,
             "error": f"Coordinator client initialization failed: {e}",
@@ -583,60 +1255,69 @@ async def coordinate_agent_results(agent_results: dict, query: str, coordinator_
         }
     
     # Prepare agent data for coordinator with detailed extraction
-    print(f"📋 Preparing agent data for coordinator...")
-    agent_data = ""
+    parts = []
     total_reddit_posts = 0
     all_reddit_urls = []
+    # Agents with overlapping focuses often return the same threads; only send
+    # each thread to the coordinator once
+    seen_urls = set()
+    duplicates_filtered = 0
     
     for i, agent in enumerate(successful_agents):
         agent_id = agent.get('agent_id', i+1)
         search_focus = agent.get('search_focus', 'Unknown focus')
         parsed_data = agent.get('parsed_data', {})
-        reddit_posts = parsed_data.get('reddit_posts', [])
-        
-        print(f"📊 Agent {agent_id}: {len(reddit_posts)} Reddit posts found")
+        reddit_posts = []
+        for post in parsed_data.get('reddit_posts', []):
+            url = post.url
+            if url:
+                canonical_url = url.split('?')[0].rstrip('/').lower()
+                if canonical_url in seen_urls:
+                    duplicates_filtered += 1
+                    continue
+                seen_urls.add(canonical_url)
+            reddit_posts.append(post)
         
-        agent_data += f"\n=== AGENT {agent_id} FINDINGS ===\n"
-        agent_data += f"Search Focus: {search_focus}\n"
-        agent_data += f"Posts Found: {len(reddit_posts)}\n"
+        parts.append(
+            f"\n=== AGENT {agent_id} FINDINGS ===\n"
+            f"Search Focus: {search_focus}\n"
+            f"Posts Found: {len(reddit_posts)}\n"
+        )
         
         if reddit_posts:
-            agent_data += "Reddit Posts:\n"
+            parts.append("Reddit Posts:\n")
             for j, post in enumerate(reddit_posts):
-                url = post.get('url', '')
-                title = post.get('title', 'No title')
-                subreddit = post.get('subreddit', 'unknown')
-                summary = post.get('summary', 'No summary')
-                
-                agent_data += f"  {j+1}. {title}\n"
-                agent_data += f"     URL: {url}\n"
-                agent_data += f"     Subreddit: r/{subreddit}\n"
-                agent_data += f"     Summary: {summary}\n\n"
+                parts.append(
+                    f"  {j+1}. {post.title}\n"
+                    f"     URL: {post.url}\n"
+                    f"     Subreddit: r/{post.subreddit}\n"
+                    f"     Summary: {post.summary}\n\n"
+                )
                 
-                if url and 'reddit.com' in url:
-                    all_reddit_urls.append(url)
+                if post.url and 'reddit.com' in post.url:
+                    all_reddit_urls.append(post.url)
                     
             total_reddit_posts += len(reddit_posts)
         else:
-            agent_data += "No Reddit posts found\n"
+            parts.append("No Reddit posts found\n")
             
         search_strategy = parsed_data.get('search_strategy', 'No strategy provided')
-        agent_data += f"Search Strategy: {search_strategy}\n\n"
+        parts.append(f"Search Strategy: {search_strategy}\n\n")
     
     if failed_agents:
-        agent_data += f"\n=== FAILED AGENTS ({len(failed_agents)}) ===\n"
+        parts.append(f"\n=== FAILED AGENTS ({len(failed_agents)}) ===\n")
         for agent in failed_agents:
             agent_id = agent.get('agent_id', 'Unknown')
             error = agent.get('error', 'Unknown error')
             error_type = agent.get('error_type', 'Unknown type')
-            agent_data += f"Agent {agent_id}: {error_type} - {error}\n"
+            parts.append(f"Agent {agent_id}: {error_type} - {error}\n")
     
-    print(f"🔗 Total Reddit URLs collected: {len(all_reddit_urls)}")
-    print(f"📊 Total Reddit posts: {total_reddit_posts}")
+    agent_data = "".join(parts)
     
-    coordinator_prompt = f"""You are the coordinator agent responsible for synthesizing findings from multiple web search agents.
-
-QUERY: "{query}"
+    logger.debug("🔗 Collected %d Reddit URLs from %d posts (%d duplicates filtered)",
+                 len(all_reddit_urls), total_reddit_posts, duplicates_filtered)
+    
+    coordinator_prompt = f"""QUERY: "{query}"
 
 SEARCH SUMMARY:
 - Total agents deployed: {len(agent_results.get('agent_results', []))}
@@ -646,44 +1327,21 @@ SEARCH SUMMARY:
 - Total Reddit URLs: {len(all_reddit_urls)}
 
 AGENT SEARCH RESULTS:
-{agent_data}
-
-CRITICAL ANALYSIS REQUIRED:
-Based on the agent findings above, provide a comprehensive analysis that includes:
-
-1. **SEARCH EFFECTIVENESS**: How well did the agents perform? Were they able to find relevant Reddit content?
-
-2. **REDDIT CONTENT ANALYSIS**: Analyze the quality and relevance of Reddit posts found
-   - Extract key themes and recommendations
-   - Identify most valuable discussions
-   - Note community consensus where present
-
-3. **RECOMMENDATIONS**: Based on the Reddit discussions found, what are the top recommendations for "{query}"?
-
-4. **LIMITATIONS**: What limitations exist in this search (failed agents, lack of results, etc.)?
-
-5. **CONFIDENCE LEVEL**: How confident are you in these recommendations given the available data?
-
-If agents failed to find meaningful Reddit content, clearly state this and explain why the search was ineffective.
+{agent_data}"""
 
-Please provide a thorough analysis even if the search results were limited."""
-
-    print(f"📤 Sending coordination request to {coordinator_model}...")
+    logger.debug("📤 Sending coordination request to %s...", coordinator_model)
     
     try:
-        message = await asyncio.to_thread(
-            client.messages.create,
+        message = await client.messages.create(
             model=coordinator_model,
             max_tokens=4000,
+            system=COORDINATOR_SYSTEM_PROMPT,
             messages=[{
                 "role": "user",
                 "content": coordinator_prompt
             }]
         )
         
-        print(f"✅ Coordinator response received")
-        print(f"📏 Response length: {len(message.content[0].text) if message.content else 0}")
-        
         coordinator_analysis = message.content[0].text if message.content else "No response from coordinator"
         
         agent_summary = {
@@ -692,11 +1350,11 @@ Please provide a thorough analysis even if the search results were limited."""
             "failed_searches": len(failed_agents),
             "total_reddit_posts": total_reddit_posts,
             "total_reddit_urls": len(all_reddit_urls),
+            "duplicates_filtered": duplicates_filtered,
             "execution_time": agent_results.get('execution_time', 0)
         }
         
-        print(f"🎯 COORDINATION COMPLETE")
-        print(f"📊 Agent summary: {agent_summary}")
+        logger.info("🎯 COORDINATION COMPLETE: %s", agent_summary)
         
         return {
             "success": True,
@@ -706,9 +1364,7 @@ Please provide a thorough analysis even if the search results were limited."""
         }
         
     except Exception as e:
-        print(f"❌ Coordinator failed: {type(e).__name__}: {e}")
-        import traceback
-        print(f"📍 Coordinator traceback: {traceback.format_exc()}")
+        logger.exception("❌ Coordinator failed: %s: %s", type(e).__name__, e)
         
         return {
             "success": False,
@@ -718,26 +1374,100 @@ Please provide a thorough analysis even if the search results were limited."""
                 "successful_searches": len(successful_agents),
                 "failed_searches": len(failed_agents),
                 "total_reddit_posts": total_reddit_posts,
-                "total_reddit_urls": len(all_reddit_urls)
+                "total_reddit_urls": len(all_reddit_urls),
+                "duplicates_filtered": duplicates_filtered
             }
         }
 
 # Enhanced search functions with browser automation and recency scoring
 
-def calculate_recency_score(post_age_days: int) -> float:
+# Upper age bounds (days) and the recency score of posts up to each bound;
+# the final score applies to anything older than the last bound
+RECENCY_AGE_BOUNDS = (30, 90, 365, 730)  # Month, 3 months, year, 2 years
+RECENCY_SCORES = (1.0, 0.8, 0.6, 0.4, 0.1)
+
+def calculate_recency_score(post_age_days: float) -> float:
     """
     Calculate recency score (0-1) based on post age
     """
-    if post_age_days <= 30:      # Last month
-        return 1.0
-    elif post_age_days <= 90:    # Last 3 months  
-        return 0.8
-    elif post_age_days <= 365:   # Last year
-        return 0.6
-    elif post_age_days <= 730:   # Last 2 years
-        return 0.4
-    else:                        # Older than 2 years
-        return 0.1
+    return RECENCY_SCORES[bisect_left(RECENCY_AGE_BOUNDS, post_age_days)]
+
+def calculate_recency_scores(post_ages_days) -> list:
+    """
+    Calculate recency scores for a batch of post ages in one pass
+    """
+    bounds, scores = RECENCY_AGE_BOUNDS, RECENCY_SCORES
+    return [scores[bisect_left(bounds, age)] for age in post_ages_days]
+
+# Only q and num vary between searches; the rest of the query string is fixed
+GOOGLE_SEARCH_BASE = "https://www.google.com/search?q="
+GOOGLE_SEARCH_SUFFIX = "&tbs=qdr%3Ay2&hl=en"  # Last 2 years for more current results
+
+def build_google_search_url(query: str, num: int) -> str:
+    """Google search URL for Reddit threads about query from the last 2 years"""
+    return f"{GOOGLE_SEARCH_BASE}{quote_plus(f'{query} site:reddit.com')}&num={num}{GOOGLE_SEARCH_SUFFIX}"
+
+def is_google_block_page(response) -> bool:
+    """True when Google answered with a consent wall, CAPTCHA or rate limit instead of results"""
+    if response.status_code == 429 or response.url.path.startswith('/sorry/'):
+        return True
+    if 'consent.google' in response.url.host:
+        return True
+    return 'captcha' in response.text[:5000].lower()
+
+async def search_google_with_http(query: str, max_posts: int = 5):
+    """
+    Fetch the Google results page as plain HTML and pull Reddit thread links out with lxml.
+    Returns None when Google blocks the request so the caller can fall back to a browser.
+    """
+    search_url = build_google_search_url(query, max_posts * 2)  # Get more to filter
+    print(f"⚡ HTTP search URL: {search_url}")
+    
+    client = await get_http_client()
+    response = await client.get(search_url)
+    if is_google_block_page(response):
+        print(f"🚧 Google served a consent/CAPTCHA page (status {response.status_code})")
+        return None
+    response.raise_for_status()
+    
+    tree = lxml.html.fromstring(response.text)
+    reddit_urls = []
+    seen_urls = set()
+    for href in tree.xpath('//a[contains(@href, "reddit.com/r/") and contains(@href, "/comments/")]/@href'):
+        # Non-JS result pages wrap targets as /url?q=<target>&...
+        if href.startswith('/url?'):
+            href = parse_qs(urlparse(href).query).get('q', [''])[0]
+        if href.startswith('http') and href not in seen_urls:
+            seen_urls.add(href)
+            reddit_urls.append(href)
+            if len(reddit_urls) >= max_posts:
+                break
+    
+    print(f"🔗 HTTP search found {len(reddit_urls)} Reddit links")
+    return reddit_urls
+
+async def search_google_for_reddit_urls(query: str, max_posts: int = 5):
+    """
+    Search Google for Reddit posts, starting with a plain HTTP fetch and only
+    launching the headless browser when Google blocks it or finds nothing
+    """
+    cache_key = ('google', normalize_query(query), max_posts)
+    cached = SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"♻️ Using cached Google results for '{query}'")
+        return list(cached)
+    
+    reddit_urls = None
+    try:
+        reddit_urls = await search_google_with_http(query, max_posts)
+    except Exception as e:
+        print(f"❌ HTTP search failed: {e}")
+    
+    if not reddit_urls:
+        reddit_urls = await search_google_with_browser(query, max_posts)
+    if reddit_urls:
+        SEARCH_CACHE.put(cache_key, tuple(reddit_urls))
+    return reddit_urls
 
 async def search_google_with_browser(query: str, max_posts: int = 5):
     """
@@ -746,73 +1476,77 @@ async def search_google_with_browser(query: str, max_posts: int = 5):
     print(f"🎭 Starting browser search for: '{query}'")
     
     try:
-        async with async_playwright() as p:
-            # Launch browser in headless mode
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-            )
+        # The browser and its contexts are shared; each search only opens a page
+        async with browser_context() as context:
             page = await context.new_page()
+            try:
+                # Construct search with time filtering for recent results
+                search_url = build_google_search_url(query, max_posts * 2)  # Get more to filter
+                print(f"🔍 Browser search URL: {search_url}")
             
-            # Construct search with time filtering for recent results
-            search_params = {
-                'q': f'{query} site:reddit.com',
-                'num': str(max_posts * 2),  # Get more to filter
-                'tbs': 'qdr:y2',  # Last 2 years for more current results
-                'hl': 'en'
-            }
-            
-            search_url = f"https://www.google.com/search?{urlencode(search_params)}"
-            print(f"🔍 Browser search URL: {search_url}")
-            
-            # Navigate to Google search
-            await page.goto(search_url, wait_until='networkidle', timeout=30000)
+                # Navigate to Google search
+                await page.goto(search_url, wait_until='networkidle', timeout=30000)
             
-            # Wait for results to load
-            await page.wait_for_selector('div[data-ved]', timeout=15000)
+                # Wait for results to load
+                await page.wait_for_selector('div[data-ved]', timeout=15000)
             
-            # Extract search result links
-            links = await page.evaluate('''
-                () => {
-                    const results = [];
-                    const searchResults = document.querySelectorAll('div[data-ved] a[href*="reddit.com"]');
+                # Extract search result links
+                links = await page.evaluate('''
+                    () => {
+                        const results = [];
+                        const searchResults = document.querySelectorAll('div[data-ved] a[href*="reddit.com"]');
                     
-                    for (const link of searchResults) {
-                        const href = link.href;
-                        const title = link.textContent || '';
-                        const parent = link.closest('div[data-ved]');
-                        const snippet = parent?.querySelector('span[style*="-webkit-line-clamp"]')?.textContent || '';
+                        for (const link of searchResults) {
+                            const href = link.href;
+                            const title = link.textContent || '';
+                            const parent = link.closest('div[data-ved]');
+                            const snippet = parent?.querySelector('span[style*="-webkit-line-clamp"]')?.textContent || '';
                         
-                        if (href && href.includes('reddit.com/r/') && href.includes('/comments/')) {
-                            results.push({
-                                url: href,
-                                title: title,
-                                snippet: snippet
-                            });
+                            if (href && href.includes('reddit.com/r/') && href.includes('/comments/')) {
+                                results.push({
+                                    url: href,
+                                    title: title,
+                                    snippet: snippet
+                                });
+                            }
                         }
-                    }
                     
-                    return results;
-                }
-            ''')
-            
-            await browser.close()
-            
-            print(f"🔗 Browser found {len(links)} Reddit links")
-            for i, link in enumerate(links[:3]):
-                print(f"  {i+1}. {link['title'][:80]}...")
-                print(f"     URL: {link['url']}")
-            
-            # Extract Reddit URLs and limit to max_posts
-            reddit_urls = [link['url'] for link in links][:max_posts]
-            
-            return reddit_urls
+                        return results;
+                    }
+                ''')
+            finally:
+                await page.close()
+        
+        print(f"🔗 Browser found {len(links)} Reddit links")
+        for i, link in enumerate(links[:3]):
+            print(f"  {i+1}. {link['title'][:80]}...")
+            print(f"     URL: {link['url']}")
+        
+        # Extract Reddit URLs and limit to max_posts
+        reddit_urls = [link['url'] for link in links][:max_posts]
+        
+        return reddit_urls
             
     except Exception as e:
         print(f"❌ Browser search failed: {e}")
         print(f"📚 Falling back to requests-based search...")
         return await search_google_with_fallback(query, max_posts)
 
+# Reddit URLs found per (engine, normalized query, result count). Only non-empty
+# results are stored so a blocked or failed search is retried next time.
+SEARCH_CACHE = TTLCache(maxsize=256, ttl=900)
+
+# Reddit links sit near the top of a results page; anything past this is markup
+SEARCH_HTML_MAX_BYTES = 512 * 1024
+
+def read_search_html(response) -> str:
+    """Read at most SEARCH_HTML_MAX_BYTES of a streamed search results page and close it"""
+    try:
+        body = response.raw.read(SEARCH_HTML_MAX_BYTES, decode_content=True)
+    finally:
+        response.close()
+    return body.decode(response.encoding or 'utf-8', errors='ignore')
+
 async def search_google_with_fallback(query: str, max_posts: int = 5):
     """
     Fallback to requests-based search with better time filtering
@@ -831,6 +1565,7 @@ async def search_google_with_fallback(query: str, max_posts: int = 5):
         }
         
         all_urls = []
+        seen_urls = set()
         
         for search_query in search_queries:
             if len(all_urls) >= max_posts:
@@ -841,23 +1576,28 @@ async def search_google_with_fallback(query: str, max_posts: int = 5):
             search_url = f"https://www.google.com/search?q={quote(search_query)}&num={max_posts}"
             
             try:
-                response = requests.get(search_url, headers=headers, timeout=10)
+                # This runs on the shared background loop, so the blocking
+                # fetch goes to a worker thread instead of stalling other requests
+                response = await asyncio.to_thread(
+                    _HTTP.get, search_url, headers=headers, timeout=10, stream=True
+                )
+                html = await asyncio.to_thread(read_search_html, response)
                 
                 # Extract Reddit URLs using regex
-                patterns = [
-                    r'https://(?:www\.)?reddit\.com/r/[^/]+/comments/[^/\s"\'<>&]+',
-                    r'reddit\.com/r/[^/]+/comments/[^/\s"\'<>&]+',
-                ]
-                
-                for pattern in patterns:
-                    matches = re.findall(pattern, response.text)
-                    for match in matches:
+                for pattern in _REDDIT_THREAD_URL_RES[:2]:
+                    for m in pattern.finditer(html):
+                        match = m.group()
                         if match.startswith('reddit.com'):
                             match = f"https://{match}"
                         
-                        if match not in all_urls and len(all_urls) < max_posts:
+                        if match not in seen_urls:
+                            seen_urls.add(match)
                             all_urls.append(match)
                             print(f"  ✅ Fallback found: {match}")
+                            if len(all_urls) >= max_posts:
+                                break
+                    if len(all_urls) >= max_posts:
+                        break
                             
             except Exception as e:
                 print(f"  ❌ Fallback query failed: {e}")
@@ -871,6 +1611,12 @@ async def search_google_with_fallback(query: str, max_posts: int = 5):
 
 def search_google_for_reddit_posts(query, num_results=5):
     """Search Google for Reddit posts related to the query"""
+    cache_key = ('google_requests', normalize_query(query), num_results)
+    cached = SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"♻️ Using cached Google results for '{query}'")
+        return list(cached)
+    
     try:
         # Add site:reddit.com to search only Reddit
         google_query = f"{query} site:reddit.com"
@@ -891,59 +1637,61 @@ def search_google_for_reddit_posts(query, num_results=5):
         print(f"🌐 Search URL: {search_url}")
         
         print("📡 Making request to Google...")
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = _HTTP.get(search_url, headers=headers, timeout=15, stream=True)
+        html = read_search_html(response)
         print(f"📊 Response status: {response.status_code}")
-        print(f"📏 Response length: {len(response.text)} characters")
+        print(f"📏 Response length: {len(html)} characters")
         
         response.raise_for_status()
         
         # Save response for debugging
         print("💾 Saving response snippet for debugging...")
-        response_snippet = response.text[:2000]
+        response_snippet = html[:2000]
         print(f"📄 Response snippet: {response_snippet}")
         
         # Extract Reddit URLs from the search results
         reddit_urls = []
+        seen_urls = set()
         
-        # Try multiple patterns to find Reddit URLs
-        patterns = [
-            r'https://(?:www\.)?reddit\.com/r/[^/]+/comments/[^/\s"\'<>&]+',
-            r'reddit\.com/r/[^/]+/comments/[^/\s"\'<>&]+',
-            r'/r/[^/]+/comments/[^/\s"\'<>&]+',
-        ]
-        
+        # Try multiple patterns to find Reddit URLs, stopping once we have enough
         print("🔎 Searching for Reddit URLs with patterns...")
-        all_matches = []
-        
-        for i, pattern in enumerate(patterns):
-            matches = re.findall(pattern, response.text)
-            print(f"Pattern {i+1}: Found {len(matches)} matches")
-            if matches:
-                print(f"  First few matches: {matches[:3]}")
-            all_matches.extend(matches)
-        
-        # Normalize URLs
-        for match in all_matches:
-            if match.startswith('http'):
-                url = match
-            elif match.startswith('reddit.com'):
-                url = f"https://{match}"
-            elif match.startswith('/r/'):
-                url = f"https://reddit.com{match}"
-            else:
-                continue
-                
-            # Clean up URL (remove trailing characters)
-            url = re.sub(r'[^\w\-\./:]', '', url.split()[0])
+        
+        for i, pattern in enumerate(_REDDIT_THREAD_URL_RES):
+            if len(reddit_urls) >= num_results:
+                break
             
-            if url not in [u for u in reddit_urls] and len(reddit_urls) < num_results:
-                reddit_urls.append(url)
-                print(f"✅ Added URL: {url}")
+            match_count = 0
+            for m in pattern.finditer(html):
+                match_count += 1
+                match = m.group()
+                
+                # Normalize URLs
+                if match.startswith('http'):
+                    url = match
+                elif match.startswith('reddit.com'):
+                    url = f"https://{match}"
+                elif match.startswith('/r/'):
+                    url = f"https://reddit.com{match}"
+                else:
+                    continue
+                    
+                # Clean up URL (remove trailing characters)
+                url = _URL_JUNK_RE.sub('', url.partition(' ')[0])
+                
+                if url not in seen_urls:
+                    seen_urls.add(url)
+                    reddit_urls.append(url)
+                    print(f"✅ Added URL: {url}")
+                    if len(reddit_urls) >= num_results:
+                        break
+            print(f"Pattern {i+1}: Scanned {match_count} matches")
         
         print(f"🎯 Final Reddit URLs found: {len(reddit_urls)}")
         for i, url in enumerate(reddit_urls):
             print(f"  {i+1}. {url}")
         
+        if reddit_urls:
+            SEARCH_CACHE.put(cache_key, tuple(reddit_urls))
         return reddit_urls
         
     except requests.exceptions.RequestException as e:
@@ -952,12 +1700,17 @@ def search_google_for_reddit_posts(query, num_results=5):
     except Exception as e:
         print(f"❌ Error searching Google: {e}")
         print(f"❌ Error type: {type(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.debug("❌ Traceback", exc_info=True)
         return []
 
 def search_duckduckgo_for_reddit_posts(query, num_results=5):
     """Fallback: Search DuckDuckGo for Reddit posts"""
+    cache_key = ('duckduckgo', normalize_query(query), num_results)
+    cached = SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"♻️ Using cached DuckDuckGo results for '{query}'")
+        return list(cached)
+    
     try:
         search_query = f"{query} site:reddit.com"
         print(f"🦆 DuckDuckGo search query: {search_query}")
@@ -969,53 +1722,59 @@ def search_duckduckgo_for_reddit_posts(query, num_results=5):
         search_url = f"https://duckduckgo.com/html/?q={requests.utils.quote(search_query)}"
         print(f"🌐 DuckDuckGo URL: {search_url}")
         
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = _HTTP.get(search_url, headers=headers, timeout=15, stream=True)
+        html = read_search_html(response)
         print(f"📊 DuckDuckGo response status: {response.status_code}")
         
         response.raise_for_status()
         
         # Extract Reddit URLs
         reddit_urls = []
-        pattern = r'https://(?:www\.)?reddit\.com/r/[^/]+/comments/[^/\s"\'<>&]+'
-        matches = re.findall(pattern, response.text)
-        
         seen_urls = set()
-        for match in matches:
-            if match not in seen_urls and len(reddit_urls) < num_results:
+        for m in _REDDIT_THREAD_URL_RES[0].finditer(html):
+            match = m.group()
+            if match not in seen_urls:
                 seen_urls.add(match)
                 reddit_urls.append(match)
                 print(f"✅ DuckDuckGo found: {match}")
+                if len(reddit_urls) >= num_results:
+                    break
         
         print(f"🦆 DuckDuckGo found {len(reddit_urls)} URLs")
+        if reddit_urls:
+            SEARCH_CACHE.put(cache_key, tuple(reddit_urls))
         return reddit_urls
         
     except Exception as e:
         print(f"❌ DuckDuckGo search error: {e}")
         return []
 
+def reddit_post_id(url):
+    """Extract the post ID from a Reddit thread URL, or None if it has none"""
+    # URL format: https://reddit.com/r/subreddit/comments/post_id/title/
+    url_parts = url.split('/')
+    if 'comments' in url_parts:
+        post_id_index = url_parts.index('comments') + 1
+        if post_id_index < len(url_parts) and url_parts[post_id_index]:
+            return url_parts[post_id_index]
+    return None
+
 def get_reddit_post_from_url(reddit, url):
     """Get Reddit post object from URL"""
     try:
         print(f"🔗 Processing URL: {url}")
         
-        # Extract post ID from URL
-        # URL format: https://reddit.com/r/subreddit/comments/post_id/title/
-        url_parts = url.split('/')
-        print(f"📂 URL parts: {url_parts}")
-        
-        if 'comments' in url_parts:
-            post_id_index = url_parts.index('comments') + 1
-            if post_id_index < len(url_parts):
-                post_id = url_parts[post_id_index]
-                print(f"🆔 Extracted post ID: {post_id}")
-                
-                print(f"📡 Fetching Reddit post...")
-                submission = reddit.submission(id=post_id)
-                
-                # Try to access a property to ensure the post exists
-                title = submission.title
-                print(f"✅ Successfully got post: {title[:50]}...")
-                return submission
+        post_id = reddit_post_id(url)
+        if post_id:
+            print(f"🆔 Extracted post ID: {post_id}")
+            
+            print(f"📡 Fetching Reddit post...")
+            submission = reddit.submission(id=post_id)
+            
+            # Try to access a property to ensure the post exists
+            title = submission.title
+            print(f"✅ Successfully got post: {title[:50]}...")
+            return submission
         
         print(f"❌ Could not extract post ID from URL: {url}")
         return None
@@ -1023,9 +1782,106 @@ def get_reddit_post_from_url(reddit, url):
     except Exception as e:
         print(f"❌ Error getting post from URL {url}: {e}")
         print(f"❌ Error type: {type(e)}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.debug("❌ Traceback", exc_info=True)
+        return None
+
+# Submission snapshots keyed by post ID, checked before fetching so the same
+# thread reached through differently formatted URLs or repeat searches is only
+# fetched from Reddit once.
+# Plain dicts are cached rather than PRAW objects, which are not thread-safe.
+SUBMISSION_CACHE = TTLCache(maxsize=512, ttl=600)
+
+# PRAW instances are not thread-safe, so each Reddit worker thread gets its
+# own client. The pool is long-lived so those clients (and their OAuth
+# tokens) are reused across requests; max_posts is capped at 10.
+_REDDIT_POOL = ThreadPoolExecutor(max_workers=10, thread_name_prefix='reddit')
+_reddit_local = threading.local()
+
+def get_reddit():
+    """Return the calling thread's praw.Reddit client, creating it on first use"""
+    reddit = getattr(_reddit_local, 'reddit', None)
+    if reddit is None:
+        reddit = _reddit_local.reddit = praw.Reddit(
+            client_id=os.getenv("REDDIT_CLIENT_ID"),
+            client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
+            user_agent=os.getenv("REDDIT_USER_AGENT"),
+        )
+    return reddit
+
+def fetch_reddit_post(url):
+    """
+    Fetch the post at url and snapshot it on the calling thread, so the PRAW
+    submission never leaves the thread whose client loaded it. Posts already
+    in SUBMISSION_CACHE are returned without contacting Reddit.
+    """
+    post_id = reddit_post_id(url)
+    post = SUBMISSION_CACHE.get(post_id) if post_id else None
+    if post is not None:
+        print(f"♻️ Using cached post {post_id}: {post['title'][:50]}...")
+        return post
+    
+    submission = get_reddit_post_from_url(get_reddit(), url)
+    if submission is None:
+        return None
+    try:
+        post = snapshot_submission(submission)
+    except Exception as e:
+        print(f"❌ Failed to load comments for {submission.id}: {e}")
         return None
+    SUBMISSION_CACHE.put(submission.id, post)
+    return post
+
+def fetch_reddit_posts(urls, max_posts):
+    """
+    Fetch and snapshot up to max_posts posts from urls concurrently, keeping
+    URL order. URLs are tried in windows sized to the number of posts still needed.
+    """
+    posts = []
+    remaining = list(urls)
+    while remaining and len(posts) < max_posts:
+        needed = max_posts - len(posts)
+        window, remaining = remaining[:needed], remaining[needed:]
+        for post in _REDDIT_POOL.map(fetch_reddit_post, window):
+            if post:
+                posts.append(post)
+    return posts
+
+def snapshot_submission(submission) -> dict:
+    """
+    Copy the fields the analysis needs out of a PRAW submission and its comments
+    into plain dicts, so later reads never touch PRAW's lazy attributes
+    """
+    submission.comments.replace_more(limit=0)
+    return {
+        'id': submission.id,
+        'title': submission.title,
+        'score': submission.score,
+        'upvote_ratio': submission.upvote_ratio,
+        'num_comments': submission.num_comments,
+        'created_utc': submission.created_utc,
+        'subreddit': str(submission.subreddit),
+        'author': str(submission.author) if submission.author else '[deleted]',
+        'selftext': submission.selftext,
+        'url': submission.url,
+        'is_self': submission.is_self,
+        'comments': [
+            {
+                'id': comment.id,
+                'body': comment.body,
+                'score': comment.score,
+                'created_utc': comment.created_utc,
+                'author': str(comment.author) if comment.author else '[deleted]',
+                'is_submitter': comment.is_submitter
+            }
+            for comment in submission.comments.list()
+        ]
+    }
+
+REMOVED_COMMENT_BODIES = frozenset(['', '[deleted]', '[removed]'])
+
+def is_visible_comment(comment: dict) -> bool:
+    """False for comment snapshots whose text or author has been deleted or removed"""
+    return comment['body'] not in REMOVED_COMMENT_BODIES and comment['author'] != '[deleted]'
 
 # Enhanced Link Discovery Functions
 
@@ -1033,11 +1889,9 @@ def extract_link_enhancement_data(ai_response):
     """Extract structured JSON data from AI response for link enhancement"""
     try:
         # Look for JSON block in the response
-        json_pattern = r'```json\s*(\{.*?\})\s*```'
-        match = re.search(json_pattern, ai_response, re.DOTALL)
+        match = _JSON_OBJECT_BLOCK_RE.search(ai_response)
         
         if match:
-            import json
             json_str = match.group(1)
             data = json.loads(json_str)
             print(f"🔗 Extracted link enhancement data: {len(data.get('search_terms', []))} search terms, {len(data.get('reddit_links', []))} Reddit links")
@@ -1095,7 +1949,7 @@ def search_google_for_product_links(search_term, max_results=3):
             'fields': 'items(title,link,snippet)'  # Get what we need for filtering
         }
         
-        response = requests.get(api_url, params=params, timeout=15)
+        response = _HTTP.get(api_url, params=params, timeout=15)
         response.raise_for_status()
         
         data = response.json()
@@ -1194,11 +2048,9 @@ Focus on official stores, reputable review sites, and direct product pages. Avoi
         response = call_ai_model(model, prompt, max_tokens=500)
         
         # Extract JSON from response
-        json_pattern = r'```json\s*(\[.*?\])\s*```'
-        match = re.search(json_pattern, response, re.DOTALL)
+        match = _JSON_ARRAY_BLOCK_RE.search(response)
         
         if match:
-            import json
             curated_links = json.loads(match.group(1))
             print(f"🎯 AI curated {len(curated_links)} links for '{search_term}'")
             return curated_links
@@ -1220,8 +2072,49 @@ def enhance_summary_with_links(summary, search_terms, enhanced_links):
         "link_enhancement_enabled": True
     }
 
-def analyze_reddit_data(submissions, query):
-    """Perform comprehensive analysis of Reddit data"""
+# Common brands (expandable)
+BRAND_NAMES = (
+    'uniqlo', 'nike', 'adidas', 'gap', 'h&m', 'zara', 'target', 'walmart', 'amazon', 'costco',
+    'everlane', 'patagonia', r"levi'?s?", 'wrangler', 'carhartt', 'dickies',
+    'supreme', 'palace', 'off-white', 'gucci', 'prada', 'louis vuitton',
+    'next level', 'bella canvas', 'hanes', 'fruit of the loom', 'gildan',
+)
+
+SENTIMENT_WORDS = MappingProxyType({
+    'positive': ('great', 'excellent', 'amazing', 'perfect', 'best', 'love', 'awesome', 'fantastic', 'recommend', 'good'),
+    'negative': ('terrible', 'awful', 'worst', 'hate', 'bad', 'horrible', 'disappointing', 'cheap', 'poor', 'avoid'),
+})
+
+# Brands, prices ($12.99 / 12 dollars / 12 bucks) and sentiment words in one
+# case-insensitive pattern, so each post and comment is scanned once.
+# The name of the matched group says which kind of mention it was.
+CONTENT_RE = re.compile(
+    r'\b(?P<brand>' + '|'.join(BRAND_NAMES) + r')\b'
+    r'|\$(?P<usd>\d+(?:\.\d{2})?)'
+    r'|(?P<amount>\d+(?:\.\d{2})?) (?:dollars?|bucks?)'
+    r'|\b(?P<positive>' + '|'.join(map(re.escape, SENTIMENT_WORDS['positive'])) + r')\b'
+    r'|\b(?P<negative>' + '|'.join(map(re.escape, SENTIMENT_WORDS['negative'])) + r')\b',
+    re.IGNORECASE
+)
+
+def scan_content(text: str, brand_counter: Counter, price_mentions: list, sentiment_counter: Counter):
+    """Collect brand, price and sentiment mentions from one post or comment"""
+    for match in CONTENT_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == 'brand':
+            brand_counter[match.group(kind).lower()] += 1
+        elif kind == 'usd' or kind == 'amount':
+            price = float(match.group(kind))
+            if 1 <= price <= 1000:  # Reasonable t-shirt price range
+                price_mentions.append(price)
+        else:
+            sentiment_counter[kind] += 1
+
+def analyze_reddit_data(posts, query):
+    """
+    Perform comprehensive analysis of Reddit data from submission snapshots.
+    Returns the analysis and the per-post records it built (with age_days).
+    """
     analysis = {
         'post_metrics': {},
         'engagement_analysis': {},
@@ -1234,108 +2127,41 @@ def analyze_reddit_data(submissions, query):
     print("📊 Starting comprehensive data analysis...")
     
     # Collect all data points
+    now_ts = time.time()
     all_posts = []
     all_comments = []
-    brands_mentioned = []
+    brand_counter = Counter()
+    sentiment_counter = Counter()
     price_mentions = []
-    sentiment_words = {
-        'positive': ['great', 'excellent', 'amazing', 'perfect', 'best', 'love', 'awesome', 'fantastic', 'recommend', 'good'],
-        'negative': ['terrible', 'awful', 'worst', 'hate', 'bad', 'horrible', 'disappointing', 'cheap', 'poor', 'avoid']
-    }
     
-    for submission in submissions:
+    for post in posts:
         # Post-level data
-        post_data = {
-            'id': submission.id,
-            'title': submission.title,
-            'score': submission.score,
-            'upvote_ratio': submission.upvote_ratio,
-            'num_comments': submission.num_comments,
-            'created_utc': submission.created_utc,
-            'subreddit': str(submission.subreddit),
-            'author': str(submission.author) if submission.author else '[deleted]',
-            'selftext': submission.selftext,
-            'url': submission.url,
-            'is_self': submission.is_self,
-            'comments': []
-        }
+        post_data = {**post, 'analyzed_comments': []}
         
         # Age calculation
-        post_age_days = (datetime.now(timezone.utc).timestamp() - submission.created_utc) / (24 * 3600)
+        post_age_days = (now_ts - post['created_utc']) / (24 * 3600)
         post_data['age_days'] = post_age_days
         
-        # Extract brand mentions and prices from post
-        text_content = f"{submission.title} {submission.selftext}".lower()
-        
-        # Common brands (expandable)
-        brand_patterns = [
-            r'\b(uniqlo|nike|adidas|gap|h&m|zara|target|walmart|amazon|costco)\b',
-            r'\b(everlane|patagonia|levi\'?s?|wrangler|carhartt|dickies)\b',
-            r'\b(supreme|palace|off-white|gucci|prada|louis vuitton)\b',
-            r'\b(next level|bella canvas|hanes|fruit of the loom|gildan)\b'
-        ]
-        
-        for pattern in brand_patterns:
-            brands_mentioned.extend(re.findall(pattern, text_content))
-        
-        # Price extraction
-        price_patterns = [
-            r'\$(\d+(?:\.\d{2})?)',
-            r'(\d+(?:\.\d{2})?) dollars?',
-            r'(\d+(?:\.\d{2})?) bucks?'
-        ]
-        
-        for pattern in price_patterns:
-            matches = re.findall(pattern, text_content)
-            for match in matches:
-                try:
-                    price = float(match)
-                    if 1 <= price <= 1000:  # Reasonable t-shirt price range
-                        price_mentions.append(price)
-                except:
-                    pass
+        # Extract brand mentions, prices and sentiment from post
+        scan_content(post['title'], brand_counter, price_mentions, sentiment_counter)
+        scan_content(post['selftext'], brand_counter, price_mentions, sentiment_counter)
         
         # Process comments
-        submission.comments.replace_more(limit=0)
         comment_scores = []
-        comment_count = 0
         
-        for comment in submission.comments.list():
-            if comment_count >= 10:  # Analyze top 10 comments
-                break
-                
-            comment_data = {
-                'id': comment.id,
-                'body': comment.body,
-                'score': comment.score,
-                'created_utc': comment.created_utc,
-                'author': str(comment.author) if comment.author else '[deleted]',
-                'is_submitter': comment.is_submitter
-            }
+        for comment in post['comments'][:10]:  # Analyze top 10 comments
+            comment_data = {**comment}
             
             # Comment age
-            comment_age_days = (datetime.now(timezone.utc).timestamp() - comment.created_utc) / (24 * 3600)
+            comment_age_days = (now_ts - comment['created_utc']) / (24 * 3600)
             comment_data['age_days'] = comment_age_days
             
-            # Extract brands and prices from comments
-            comment_text = comment.body.lower()
-            for pattern in brand_patterns:
-                brands_mentioned.extend(re.findall(pattern, comment_text))
-            
-            for pattern in price_patterns:
-                matches = re.findall(pattern, comment_text)
-                for match in matches:
-                    try:
-                        price = float(match)
-                        if 1 <= price <= 1000:
-                            price_mentions.append(price)
-                    except:
-                        pass
+            # Extract brands, prices and sentiment from comments
+            scan_content(comment['body'], brand_counter, price_mentions, sentiment_counter)
             
-            comment_scores.append(comment.score)
-            post_data['comments'].append(comment_data)
+            comment_scores.append(comment['score'])
+            post_data['analyzed_comments'].append(comment_data)
             all_comments.append(comment_data)
-            comment_count += 1
         
         post_data['comment_scores'] = comment_scores
         all_posts.append(post_data)
@@ -1346,38 +2172,43 @@ def analyze_reddit_data(submissions, query):
     post_ages = [p['age_days'] for p in all_posts]
     upvote_ratios = [p['upvote_ratio'] for p in all_posts]
     
+    # Each total is computed once and shared by the averages and rates below
+    total_upvotes = sum(post_scores)
+    total_comments = sum(post_comment_counts)
+    post_count = len(all_posts)
+    avg_comments = round(total_comments / post_count, 1) if post_count else 0
+    
     analysis['post_metrics'] = {
-        'total_posts': len(all_posts),
-        'avg_score': round(statistics.mean(post_scores), 1) if post_scores else 0,
+        'total_posts': post_count,
+        'avg_score': round(total_upvotes / post_count, 1) if post_count else 0,
         'median_score': round(statistics.median(post_scores), 1) if post_scores else 0,
         'max_score': max(post_scores) if post_scores else 0,
-        'total_upvotes': sum(post_scores),
-        'avg_comments': round(statistics.mean(post_comment_counts), 1) if post_comment_counts else 0,
-        'total_comments': sum(post_comment_counts),
-        'avg_upvote_ratio': round(statistics.mean(upvote_ratios), 2) if upvote_ratios else 0,
-        'avg_post_age_days': round(statistics.mean(post_ages), 1) if post_ages else 0
+        'total_upvotes': total_upvotes,
+        'avg_comments': avg_comments,
+        'total_comments': total_comments,
+        'avg_upvote_ratio': round(statistics.fmean(upvote_ratios), 2) if upvote_ratios else 0,
+        'avg_post_age_days': round(statistics.fmean(post_ages), 1) if post_ages else 0
     }
     
     # ENGAGEMENT ANALYSIS
     all_comment_scores = [c['score'] for c in all_comments]
     analysis['engagement_analysis'] = {
         'total_comments_analyzed': len(all_comments),
-        'avg_comment_score': round(statistics.mean(all_comment_scores), 1) if all_comment_scores else 0,
+        'avg_comment_score': round(statistics.fmean(all_comment_scores), 1) if all_comment_scores else 0,
         'median_comment_score': round(statistics.median(all_comment_scores), 1) if all_comment_scores else 0,
-        'highly_upvoted_comments': len([s for s in all_comment_scores if s >= 10]),
-        'engagement_rate': round(sum(post_comment_counts) / sum(post_scores) * 100, 2) if sum(post_scores) > 0 else 0,
-        'comments_per_post': round(statistics.mean(post_comment_counts), 1) if post_comment_counts else 0
+        'highly_upvoted_comments': sum(1 for s in all_comment_scores if s >= 10),
+        'engagement_rate': round(total_comments / total_upvotes * 100, 2) if total_upvotes > 0 else 0,
+        'comments_per_post': avg_comments
     }
     
     # CONTENT ANALYSIS
-    brand_counter = Counter(brands_mentioned)
     top_brands = brand_counter.most_common(10)
     
     price_analysis = {}
     if price_mentions:
         price_analysis = {
             'prices_found': len(price_mentions),
-            'avg_price': round(statistics.mean(price_mentions), 2),
+            'avg_price': round(statistics.fmean(price_mentions), 2),
             'median_price': round(statistics.median(price_mentions), 2),
             'min_price': min(price_mentions),
             'max_price': max(price_mentions),
@@ -1386,7 +2217,7 @@ def analyze_reddit_data(submissions, query):
     
     analysis['content_analysis'] = {
         'top_brands': top_brands,
-        'total_brand_mentions': len(brands_mentioned),
+        'total_brand_mentions': sum(brand_counter.values()),
         'unique_brands': len(brand_counter),
         'price_analysis': price_analysis
     }
@@ -1400,9 +2231,10 @@ def analyze_reddit_data(submissions, query):
     total_weight = 0
     post_recency_data = []
     
-    for post in all_posts:
+    recency_scores = calculate_recency_scores([p['age_days'] for p in all_posts])
+    
+    for post, recency_score in zip(all_posts, recency_scores):
         age_days = post['age_days']
-        recency_score = calculate_recency_score(age_days)
         weight = post['score'] * recency_score  # Weight by both upvotes and recency
         
         total_weighted_score += weight
@@ -1439,13 +2271,9 @@ def analyze_reddit_data(submissions, query):
         'community_diversity': len(subreddit_counter)
     }
     
-    # SENTIMENT INDICATORS
-    all_text = " ".join([p['title'] + " " + p['selftext'] for p in all_posts] + 
-                       [c['body'] for c in all_comments]).lower()
-    
-    positive_count = sum(all_text.count(word) for word in sentiment_words['positive'])
-    negative_count = sum(all_text.count(word) for word in sentiment_words['negative'])
-    
+    # SENTIMENT INDICATORS (word counts accumulated per post and comment above)
+    positive_count = sentiment_counter['positive']
+    negative_count = sentiment_counter['negative']
     analysis['sentiment_indicators'] = {
         'positive_word_count': positive_count,
         'negative_word_count': negative_count,
@@ -1454,7 +2282,7 @@ def analyze_reddit_data(submissions, query):
     }
     
     print(f"✅ Analysis complete: {len(all_posts)} posts, {len(all_comments)} comments analyzed")
-    return analysis
+    return analysis, all_posts
 
 @app.route('/api/search-summarize', methods=['POST'])
 def search_summarize():
@@ -1467,16 +2295,18 @@ def search_summarize():
     use_web_search = data.get('use_web_search', False)
     agent_count = data.get('agent_count', 3)
     coordinator_model = data.get('coordinator_model', 'claude-3-5-sonnet-20241022')
+    # Traditional mode only: send the summary as server-sent events
+    stream = data.get('stream', False) is True
 
     if not query:
         return jsonify({'error': 'Query is required'}), 400
     
     # Validate max_posts
-    if not isinstance(max_posts, int) or max_posts < 1 or max_posts > 10:
+    if not isinstance(max_posts, int) or not 1 <= max_posts <= 10:
         return jsonify({'error': 'max_posts must be between 1 and 10'}), 400
     
     # Validate agent_count
-    if not isinstance(agent_count, int) or agent_count < 1 or agent_count > 5:
+    if not isinstance(agent_count, int) or not 1 <= agent_count <= 5:
         return jsonify({'error': 'agent_count must be between 1 and 5'}), 400
     
     # Validate models with tier-based access
@@ -1484,16 +2314,8 @@ def search_summarize():
     # TODO: Add proper authentication header parsing
     user_tier = 'anonymous'  # This will be enhanced with proper auth
     
-    all_valid_models = [
-        'gemini-1.5-flash',
-        'gemini-1.5-pro',
-        'claude-3-5-haiku-20241022',
-        'claude-3-5-sonnet-20241022', 
-        'claude-3-opus-20240229'
-    ]
-    
-    if model not in all_valid_models:
-        return jsonify({'error': f'Invalid model. Must be one of: {all_valid_models}'}), 400
+    if not isinstance(model, str) or model not in _VALID_MODEL_SET:
+        return jsonify({'error': f'Invalid model. Must be one of: {list(VALID_MODELS)}'}), 400
     
     # Check if user tier allows this model
     if not is_model_allowed(model, user_tier):
@@ -1502,8 +2324,8 @@ def search_summarize():
         elif user_tier == 'free':
             return jsonify({'error': 'This model requires a paid subscription. Please upgrade your account.'}), 403
     
-    if coordinator_model not in all_valid_models:
-        return jsonify({'error': f'Invalid coordinator_model. Must be one of: {all_valid_models}'}), 400
+    if not isinstance(coordinator_model, str) or coordinator_model not in _VALID_MODEL_SET:
+        return jsonify({'error': f'Invalid coordinator_model. Must be one of: {list(VALID_MODELS)}'}), 400
     
     # Only validate coordinator model for web search mode
     if use_web_search and not is_model_allowed(coordinator_model, user_tier):
@@ -1522,14 +2344,18 @@ def search_summarize():
             return handle_web_search_mode(query, max_posts, model, agent_count, coordinator_model)
         else:
             # Traditional Reddit search mode
-            return handle_traditional_search_mode(query, max_posts, model)
+            return handle_traditional_search_mode(query, max_posts, model, stream=stream)
             
     except Exception as e:
-        print(f"❌ Search failed: {e}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.exception("❌ Search failed: %s", e)
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
 
+async def web_search_pipeline(query: str, agent_count: int, coordinator_model: str):
+    """Run the search agents and the coordinator back to back on the background loop"""
+    agent_results = await multi_agent_web_search(query, agent_count)
+    coordinator_results = await coordinate_agent_results(agent_results, query, coordinator_model)
+    return agent_results, coordinator_results
+
 def handle_web_search_mode(query: str, max_posts: int, model: str, agent_count: int, coordinator_model: str):
     """
     Handle multi-agent web search mode
@@ -1537,20 +2363,12 @@ def handle_web_search_mode(query: str, max_posts: int, model: str, agent_count:
     print(f"🌐 Starting multi-agent web search mode...")
     
     try:
-        # Deploy multiple Haiku agents for web search
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Run multi-agent search
-        agent_results = loop.run_until_complete(multi_agent_web_search(query, agent_count))
-        
-        # Coordinate results with Sonnet/Opus
-        coordinator_results = loop.run_until_complete(
-            coordinate_agent_results(agent_results, query, coordinator_model)
+        # Deploy multiple Haiku agents for web search, then coordinate their
+        # results with Sonnet/Opus, in a single hop to the background loop
+        agent_results, coordinator_results = run_async(
+            web_search_pipeline(query, agent_count, coordinator_model)
         )
         
-        loop.close()
-        
         if not coordinator_results.get("success"):
             return jsonify({
                 'error': 'Web search coordination failed',
@@ -1559,7 +2377,7 @@ def handle_web_search_mode(query: str, max_posts: int, model: str, agent_count:
             }), 500
         
         # Return web search results
-        return jsonify({
+        return json_response({
             'summary': coordinator_results["coordinator_analysis"],
             'sources': [],  # Web search doesn't use traditional sources
             'search_mode': 'multi_agent_web_search',
@@ -1573,35 +2391,189 @@ def handle_web_search_mode(query: str, max_posts: int, model: str, agent_count:
         })
         
     except Exception as e:
-        print(f"❌ Web search mode failed: {e}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.exception("❌ Web search mode failed: %s", e)
         return jsonify({
             'error': f'Web search mode failed: {str(e)}',
             'search_mode': 'multi_agent_web_search'
         }), 500
 
-def handle_traditional_search_mode(query: str, max_posts: int, model: str):
+# Prompt for traditional-mode summaries, parsed once at import. Any literal
+# dollar sign added to it must be written as $$.
+SUMMARY_PROMPT_TEMPLATE = string.Template("""Please analyze the following Reddit data about '$query' and provide a comprehensive summary and evaluation.
+
+=== DATA ANALYSIS ===
+Post Metrics:
+- Total posts analyzed: $total_posts
+- Average upvotes: $avg_score (median: $median_score)
+- Total engagement: $total_upvotes upvotes, $total_comments comments
+- Average upvote ratio: $avg_upvote_ratio_pct%
+
+Engagement Analysis:
+- Comments analyzed: $comments_analyzed
+- Highly upvoted comments (10+ upvotes): $highly_upvoted_comments
+- Engagement rate: $engagement_rate% (comments per upvote)
+
+Content Analysis:
+- Brands mentioned: $unique_brands unique brands, $total_brand_mentions total mentions
+- Top brands: $top_brands
+$price_line
+
+Community & Freshness:
+- Communities: $communities
+- Content freshness: $freshness_score% recent (within 30 days)
+- Recency-weighted relevance: $recency_weighted_freshness%
+- Overall sentiment: $overall_sentiment (positive/negative ratio: $sentiment_ratio)
+
+$freshness_warning
+
+=== INSTRUCTIONS ===
+Based on this analysis and the raw content below, provide:
+
+1. **SUMMARY**: Main findings and recommendations with confidence levels
+2. **TOP RECOMMENDATIONS**: Specific products/brands with community consensus
+3. **PRICE INSIGHTS**: Cost analysis and value recommendations  
+4. **COMMUNITY CONSENSUS**: What the Reddit community agrees on
+5. **RELIABILITY ASSESSMENT**: How trustworthy this data is based on engagement metrics
+
+$age_instruction
+
+Pay special attention to:
+- High-upvoted content (more reliable)
+- Recent posts (more current)
+- Consistent brand mentions across multiple sources
+- Price points with community validation
+
+After your analysis, please also provide structured data for link enhancement by including the following JSON block at the end:
+
+=== LINK ENHANCEMENT DATA ===
+```json
+{
+  "reddit_links": [
+    // List of key Reddit URLs from the analysis that contain valuable information
+  ],
+  "search_terms": [
+    // List of specific product names, brands, or search terms that would benefit from external links
+    // Focus on concrete products, specific models, brand names, or services mentioned
+    // Examples: "Sony WH-1000XM4", "iPhone 15 Pro", "Toyota Camry 2024", "Best Buy"
+  ]
+}
+```
+
+=== RAW CONTENT ===
+$full_text
+
+Please provide actionable insights based on both the quantitative analysis and qualitative content, followed by the JSON data for link enhancement.""")
+
+FRESHNESS_WARNING = "⚠️ DATA FRESHNESS WARNING: Most content is outdated (low recency score). Recommendations may not reflect current market/community state. Consider data age in your analysis."
+AGE_INSTRUCTION = "IMPORTANT: Include data age limitations in your reliability assessment. Note that older posts may not reflect current conditions."
+
+def build_summary_prompt(query: str, analysis: dict, full_text: str) -> str:
+    """Fill the summary prompt template from the analysis"""
+    pm = analysis['post_metrics']
+    ea = analysis['engagement_analysis']
+    ca = analysis['content_analysis']
+    ta = analysis['temporal_analysis']
+    si = analysis['sentiment_indicators']
+    price = ca['price_analysis']
+    outdated = ta['data_age_warning']
+    
+    return SUMMARY_PROMPT_TEMPLATE.substitute(
+        query=query,
+        total_posts=pm['total_posts'],
+        avg_score=pm['avg_score'],
+        median_score=pm['median_score'],
+        total_upvotes=pm['total_upvotes'],
+        total_comments=pm['total_comments'],
+        avg_upvote_ratio_pct=f"{pm['avg_upvote_ratio']*100:.0f}",
+        comments_analyzed=ea['total_comments_analyzed'],
+        highly_upvoted_comments=ea['highly_upvoted_comments'],
+        engagement_rate=ea['engagement_rate'],
+        unique_brands=ca['unique_brands'],
+        total_brand_mentions=ca['total_brand_mentions'],
+        top_brands=', '.join(f"{brand} ({count}x)" for brand, count in ca['top_brands'][:5]),
+        price_line=(
+            f"- Price analysis: {price['prices_found']} prices found, avg ${price['avg_price']}, range {price['price_range']}"
+            if price else "- No clear pricing information found"
+        ),
+        communities=', '.join(analysis['community_analysis']['subreddits_involved']),
+        freshness_score=ta['freshness_score'],
+        recency_weighted_freshness=ta['recency_weighted_freshness'],
+        overall_sentiment=si['overall_sentiment'],
+        sentiment_ratio=si['sentiment_ratio'],
+        freshness_warning=FRESHNESS_WARNING if outdated else '',
+        age_instruction=AGE_INSTRUCTION if outdated else '',
+        full_text=full_text,
+    )
+
+def discover_enhanced_links(message: str, model: str):
+    """Find and curate product links for the search terms the summary asked for"""
+    print("🔗 Starting enhanced link discovery...")
+    
+    # Extract link enhancement data from AI response
+    link_data = extract_link_enhancement_data(message)
+    search_terms = link_data.get('search_terms', [])
+    
+    # Search for relevant links for each term
+    enhanced_links = {}
+    for term in search_terms[:5]:  # Limit to 5 terms to avoid too many API calls
+        print(f"🔍 Searching for links for term: '{term}'")
+        product_links = search_google_for_product_links(term, max_results=3)
+        
+        if product_links:
+            # Use AI to curate the best links
+            curated_links = curate_links_with_ai(term, product_links, model)
+            enhanced_links[term] = curated_links
+        else:
+            enhanced_links[term] = []
+    
+    print(f"✅ Enhanced link discovery complete. Found links for {len([k for k, v in enhanced_links.items() if v])} terms")
+    return search_terms, enhanced_links
+
+def traditional_result(message: str, sources: list, analysis: dict, model: str) -> dict:
+    """Build the traditional-mode response body from the finished summary"""
+    search_terms, enhanced_links = discover_enhanced_links(message, model)
+    return {
+        'summary': message, 
+        'sources': sources,
+        'analysis': analysis,  # Include the comprehensive analysis
+        'search_mode': 'traditional_reddit_search',
+        'enhanced_links': enhanced_links,  # Add enhanced links
+        'extracted_search_terms': search_terms,  # Add extracted terms
+        'link_enhancement_enabled': True
+    }
+
+def stream_traditional_summary(model: str, prompt: str, sources: list, analysis: dict):
+    """
+    Server-sent events for a streamed summary: a 'delta' event per text chunk,
+    then one 'result' event with the same body the non-streaming response has
+    (or an 'error' event)
+    """
+    parts = []
+    try:
+        for text in stream_ai_model(model, prompt, max_tokens=1500):
+            parts.append(text)
+            yield sse_event({'delta': text}, event='delta')
+        yield sse_event(traditional_result("".join(parts), sources, analysis, model), event='result')
+    except Exception as e:
+        print(f"❌ Streaming summary failed: {e}")
+        status = 429 if is_rate_limit_error(e) else 500
+        yield sse_event({'error': f'AI API error: {str(e)}', 'status': status}, event='error')
+
+def handle_traditional_search_mode(query: str, max_posts: int, model: str, stream: bool = False):
     """
-    Handle traditional Reddit search mode (existing logic)
+    Handle traditional Reddit search mode (existing logic). With stream=True
+    the summary is sent as server-sent events while it is generated.
     """
     try:
         # Reddit API setup
-        reddit = praw.Reddit(
-            client_id=os.getenv("REDDIT_CLIENT_ID"),
-            client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
-            user_agent=os.getenv("REDDIT_USER_AGENT"),
-        )
+        reddit = get_reddit()
 
         # Search with enhanced browser-based approach for better recency
         print(f"🔍 Starting enhanced search for query: '{query}'")
         
-        # Try browser search first for better results
+        # Try Google first (plain HTTP, then the browser) for better results
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            reddit_urls = loop.run_until_complete(search_google_with_browser(query, max_posts*2))
-            loop.close()
+            reddit_urls = run_async(search_google_for_reddit_urls(query, max_posts*2))
         except Exception as e:
             print(f"❌ Browser search failed: {e}")
             reddit_urls = []
@@ -1633,186 +2605,86 @@ def handle_traditional_search_mode(query: str, max_posts: int, model: str):
         
         print(f"🎯 Total URLs to process: {len(reddit_urls)}")
         
-        # Get Reddit post objects from URLs
-        submissions = []
-        for url in reddit_urls:
-            post = get_reddit_post_from_url(reddit, url)
-            if post:
-                submissions.append(post)
-            if len(submissions) >= max_posts:  # Limit to requested number
-                break
+        # Fetch posts and copy them and their comments out of PRAW, then
+        # analyze the snapshots
+        posts = fetch_reddit_posts(reddit_urls, max_posts)
         
-        if not submissions:
+        if not posts:
             return jsonify({'error': 'Could not retrieve Reddit posts from found URLs.'}), 404
         
-        print(f"Successfully retrieved {len(submissions)} Reddit posts:")
-        for i, submission in enumerate(submissions):
-            print(f"{i+1}. {submission.title} (r/{submission.subreddit})")
+        print(f"Successfully retrieved {len(posts)} Reddit posts:")
+        for i, post in enumerate(posts):
+            print(f"{i+1}. {post['title']} (r/{post['subreddit']})")
 
-        # Perform comprehensive data analysis
-        analysis = analyze_reddit_data(submissions, query)
+        analysis, all_posts = analyze_reddit_data(posts, query)
         
         # Extract text from posts and comments with enhanced data
-        full_text = ""
+        text_parts = []
         sources = []
-        for submission in submissions:
+        for post in all_posts:
             # Add enhanced upvote data to sources
             sources.append({
-                'title': submission.title, 
-                'url': submission.url,
-                'upvotes': submission.score,
-                'subreddit': str(submission.subreddit),
-                'num_comments': submission.num_comments,
-                'upvote_ratio': submission.upvote_ratio,
-                'age_days': round((datetime.now(timezone.utc).timestamp() - submission.created_utc) / (24 * 3600), 1)
+                'title': post['title'], 
+                'url': post['url'],
+                'upvotes': post['score'],
+                'subreddit': post['subreddit'],
+                'num_comments': post['num_comments'],
+                'upvote_ratio': post['upvote_ratio'],
+                'age_days': round(post['age_days'], 1)
             })
             
             # Include comprehensive info in the text for AI analysis
-            full_text += f"Title: {submission.title} (👍 {submission.score} upvotes, 💬 {submission.num_comments} comments, {submission.upvote_ratio*100:.0f}% upvoted)\n"
-            if submission.selftext:
-                full_text += f"Post: {submission.selftext[:1000]}\n"
+            text_parts.append(f"Title: {post['title']} (👍 {post['score']} upvotes, 💬 {post['num_comments']} comments, {post['upvote_ratio']*100:.0f}% upvoted)\n")
+            if post['selftext']:
+                text_parts.append(f"Post: {post['selftext'][:1000]}\n")
             
-            submission.comments.replace_more(limit=0)
-            comments_text = ""
-            comment_count = 0
+            # Take the top 5 comments per post by score (upvotes), best first,
+            # skipping deleted and removed ones that would waste a slot
+            candidates = (c for c in post['comments'] if is_visible_comment(c))
+            top_comments = heapq.nlargest(5, candidates, key=lambda c: c['score'])
             
-            # Sort comments by score (upvotes) to get the best ones first
-            sorted_comments = sorted(submission.comments.list(), key=lambda x: x.score, reverse=True)
-            
-            for comment in sorted_comments:
-                if comment_count >= 5:  # Limit to top 5 comments per post
-                    break
-                # Include upvote data for comments too
-                comments_text += f"Comment (👍 {comment.score}): {comment.body[:200]}\n"
-                comment_count += 1
+            # Include upvote data for each comment
+            comments_text = "".join(
+                f"Comment (👍 {comment['score']}): {comment['body'][:200]}\n"
+                for comment in top_comments
+            )
             
-            full_text += f"Top Comments:\n{comments_text}\n\n"
+            text_parts.append(f"Top Comments:\n{comments_text}\n\n")
+        full_text = "".join(text_parts)
 
         # Limit total text length to avoid rate limits
         if len(full_text) > 8000:  # Rough token limit
             full_text = full_text[:8000] + "...\n[Text truncated to stay within API limits]"
 
         # Create a comprehensive prompt with analysis data
-        prompt = f"""Please analyze the following Reddit data about '{query}' and provide a comprehensive summary and evaluation.
-
-=== DATA ANALYSIS ===
-Post Metrics:
-- Total posts analyzed: {analysis['post_metrics']['total_posts']}
-- Average upvotes: {analysis['post_metrics']['avg_score']} (median: {analysis['post_metrics']['median_score']})
-- Total engagement: {analysis['post_metrics']['total_upvotes']} upvotes, {analysis['post_metrics']['total_comments']} comments
-- Average upvote ratio: {analysis['post_metrics']['avg_upvote_ratio']*100:.0f}%
-
-Engagement Analysis:
-- Comments analyzed: {analysis['engagement_analysis']['total_comments_analyzed']}
-- Highly upvoted comments (10+ upvotes): {analysis['engagement_analysis']['highly_upvoted_comments']}
-- Engagement rate: {analysis['engagement_analysis']['engagement_rate']}% (comments per upvote)
-
-Content Analysis:
-- Brands mentioned: {analysis['content_analysis']['unique_brands']} unique brands, {analysis['content_analysis']['total_brand_mentions']} total mentions
-- Top brands: {', '.join([f"{brand} ({count}x)" for brand, count in analysis['content_analysis']['top_brands'][:5]])}
-{f"- Price analysis: {analysis['content_analysis']['price_analysis']['prices_found']} prices found, avg ${analysis['content_analysis']['price_analysis']['avg_price']}, range {analysis['content_analysis']['price_analysis']['price_range']}" if analysis['content_analysis']['price_analysis'] else "- No clear pricing information found"}
-
-Community & Freshness:
-- Communities: {', '.join(analysis['community_analysis']['subreddits_involved'])}
-- Content freshness: {analysis['temporal_analysis']['freshness_score']}% recent (within 30 days)
-- Recency-weighted relevance: {analysis['temporal_analysis']['recency_weighted_freshness']}%
-- Overall sentiment: {analysis['sentiment_indicators']['overall_sentiment']} (positive/negative ratio: {analysis['sentiment_indicators']['sentiment_ratio']})
-
-{('⚠️ DATA FRESHNESS WARNING: Most content is outdated (low recency score). Recommendations may not reflect current market/community state. Consider data age in your analysis.' if analysis['temporal_analysis']['data_age_warning'] else '')}
-
-=== INSTRUCTIONS ===
-Based on this analysis and the raw content below, provide:
-
-1. **SUMMARY**: Main findings and recommendations with confidence levels
-2. **TOP RECOMMENDATIONS**: Specific products/brands with community consensus
-3. **PRICE INSIGHTS**: Cost analysis and value recommendations  
-4. **COMMUNITY CONSENSUS**: What the Reddit community agrees on
-5. **RELIABILITY ASSESSMENT**: How trustworthy this data is based on engagement metrics
-
-{('IMPORTANT: Include data age limitations in your reliability assessment. Note that older posts may not reflect current conditions.' if analysis['temporal_analysis']['data_age_warning'] else '')}
-
-Pay special attention to:
-- High-upvoted content (more reliable)
-- Recent posts (more current)
-- Consistent brand mentions across multiple sources
-- Price points with community validation
-
-After your analysis, please also provide structured data for link enhancement by including the following JSON block at the end:
-
-=== LINK ENHANCEMENT DATA ===
-```json
-{{
-  "reddit_links": [
-    // List of key Reddit URLs from the analysis that contain valuable information
-  ],
-  "search_terms": [
-    // List of specific product names, brands, or search terms that would benefit from external links
-    // Focus on concrete products, specific models, brand names, or services mentioned
-    // Examples: "Sony WH-1000XM4", "iPhone 15 Pro", "Toyota Camry 2024", "Best Buy"
-  ]
-}}
-```
+        prompt = build_summary_prompt(query, analysis, full_text)
 
-=== RAW CONTENT ===
-{full_text}
-
-Please provide actionable insights based on both the quantitative analysis and qualitative content, followed by the JSON data for link enhancement."""
+        if stream:
+            return Response(
+                stream_with_context(stream_traditional_summary(model, prompt, sources, analysis)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
 
         # Get summary from AI model with retry logic for rate limiting
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                message = call_ai_model(model, prompt, max_tokens=1500)
-                break
-            except Exception as e:
-                if "rate limit" in str(e).lower() or "quota" in str(e).lower():
-                    if attempt == max_retries - 1:
-                        return jsonify({'error': f'Rate limit exceeded. Please try again in a few minutes. Details: {str(e)}'}), 429
-                    
-                    # Exponential backoff with jitter
-                    wait_time = (2 ** attempt) + random.uniform(0, 1)
-                    print(f"Rate limit hit, waiting {wait_time:.2f} seconds before retry {attempt + 1}/{max_retries}")
-                    time.sleep(wait_time)
-                else:
-                    return jsonify({'error': f'AI API error: {str(e)}'}), 500
-
-        # Enhanced link discovery process
-        print("🔗 Starting enhanced link discovery...")
-        
-        # Extract link enhancement data from AI response
-        link_data = extract_link_enhancement_data(message)
-        search_terms = link_data.get('search_terms', [])
-        
-        # Search for relevant links for each term
-        enhanced_links = {}
-        for term in search_terms[:5]:  # Limit to 5 terms to avoid too many API calls
-            print(f"🔍 Searching for links for term: '{term}'")
-            product_links = search_google_for_product_links(term, max_results=3)
-            
-            if product_links:
-                # Use AI to curate the best links
-                curated_links = curate_links_with_ai(term, product_links, model)
-                enhanced_links[term] = curated_links
-            else:
-                enhanced_links[term] = []
-        
-        print(f"✅ Enhanced link discovery complete. Found links for {len([k for k, v in enhanced_links.items() if v])} terms")
+        try:
+            message = call_ai_model_with_retries(model, prompt, max_tokens=1500)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                return jsonify({'error': f'Rate limit exceeded. Please try again in a few minutes. Details: {str(e)}'}), 429
+            return jsonify({'error': f'AI API error: {str(e)}'}), 500
 
-        return jsonify({
-            'summary': message, 
-            'sources': sources,
-            'analysis': analysis,  # Include the comprehensive analysis
-            'search_mode': 'traditional_reddit_search',
-            'enhanced_links': enhanced_links,  # Add enhanced links
-            'extracted_search_terms': search_terms,  # Add extracted terms
-            'link_enhancement_enabled': True
-        })
+        return json_response(traditional_result(message, sources, analysis, model))
 
     except Exception as e:
-        print(f"❌ Traditional search failed: {e}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.exception("❌ Traditional search failed: %s", e)
         return jsonify({'error': f'Traditional search failed: {str(e)}'}), 500
 
 if __name__ == '__main__':
+    # Set LOG_LEVEL=DEBUG to see per-agent and per-post detail
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    # The debug reloader runs this block in a watcher process too; only the
+    # process that serves requests (WERKZEUG_RUN_MAIN set) needs a browser
+    if os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        warm_up_browser()
     app.run(port=5001, debug=True)
@@ -3,13 +3,18 @@
 Test the enhanced web search + fetch agent
 """
 import asyncio
+import logging
+import contextlib
 import anthropic
 import os
 
-async def test_enhanced_web_search_agent():
+log = logging.getLogger(__name__)
+
+async def test_enhanced_web_search_agent(client=None, semaphore=None):
     """Test the enhanced web search + fetch workflow"""
     try:
-        client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        if client is None:
+            client = anthropic.AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
         print('🔑 API key loaded successfully')
         
         # Enhanced prompt for web search + fetch workflow
@@ -35,34 +40,36 @@ After your research, provide a detailed summary including:
 - Overall community sentiment and consensus level
 """
         
-        message = client.messages.create(
-            model='claude-3-5-haiku-latest',
-            max_tokens=3000,
-            messages=[{
-                'role': 'user', 
-                'content': prompt_content
-            }],
-            tools=[
-                {
-                    'type': 'web_search_20250305',
-                    'name': 'web_search',
-                    'max_uses': 3
-                },
-                {
-                    'type': 'web_fetch_20250910',
-                    'name': 'web_fetch', 
-                    'max_uses': 5,
-                    'citations': {'enabled': True}
+        # Concurrent probes share a semaphore so they stay under the rate limit
+        async with semaphore or contextlib.nullcontext():
+            message = await client.messages.create(
+                model='claude-3-5-haiku-latest',
+                max_tokens=3000,
+                messages=[{
+                    'role': 'user', 
+                    'content': prompt_content
+                }],
+                tools=[
+                    {
+                        'type': 'web_search_20250305',
+                        'name': 'web_search',
+                        'max_uses': 3
+                    },
+                    {
+                        'type': 'web_fetch_20250910',
+                        'name': 'web_fetch', 
+                        'max_uses': 5,
+                        'citations': {'enabled': True}
+                    }
+                ],
+                extra_headers={
+                    'anthropic-beta': 'web-search-2025-03-05,web-fetch-2025-09-10'
                 }
-            ],
-            extra_headers={
-                'anthropic-beta': 'web-search-2025-03-05,web-fetch-2025-09-10'
-            }
-        )
+            )
         
         print('✅ Message created successfully')
-        print(f'📊 Response type: {type(message)}')
-        print(f'📏 Content length: {len(message.content) if message.content else 0}')
+        log.debug('📊 Response type: %s', type(message))
+        log.debug('📏 Content length: %d', len(message.content) if message.content else 0)
         
         search_performed = False
         fetch_performed = False
@@ -81,11 +88,10 @@ After your research, provide a detailed summary including:
                         fetch_performed = True
                 if hasattr(block, 'input'):
                     print(f'Tool input: {block.input}')
-                    if 'url' in str(block.input):
-                        url = str(block.input).split("'url': '")[1].split("'")[0] if "'url': '" in str(block.input) else 'unknown'
-                        if 'reddit.com' in url:
-                            citations_found.append(url)
-                            print(f'📄 Found Reddit URL being fetched: {url}')
+                    url = block.input.get('url') if isinstance(block.input, dict) else None
+                    if url and 'reddit.com' in url:
+                        citations_found.append(url)
+                        print(f'📄 Found Reddit URL being fetched: {url}')
         
         print(f'\n🎯 SUMMARY:')
         print(f'Search performed: {search_performed}')
@@ -96,8 +102,9 @@ After your research, provide a detailed summary including:
                     
     except Exception as e:
         print(f'❌ Error: {type(e).__name__}: {e}')
-        import traceback
-        print(f'📍 Traceback: {traceback.format_exc()}')
+        log.error('📍 Traceback', exc_info=True)
 
 if __name__ == '__main__':
+    # Set LOG_LEVEL=DEBUG for response details
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
     asyncio.run(test_enhanced_web_search_agent())
\ No newline at end of file
@@ -3,37 +3,48 @@
 Simple test script to verify Claude web search API is working
 """
 import asyncio
+import logging
+import contextlib
 import anthropic
 import os
 import json
+import re
 
-async def test_simple_web_search():
+log = logging.getLogger(__name__)
+
+# Reddit thread URL with an optional trailing slug segment
+REDDIT_URL_RE = re.compile(r'https?://(?:www\.)?reddit\.com/r/[\w-]+/comments/[\w-]+(?:/[\w-]*)?/?')
+
+async def test_simple_web_search(client=None, semaphore=None):
     """Test a simple web search to debug the issue"""
     try:
-        client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        if client is None:
+            client = anthropic.AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
         print('🔑 API key loaded successfully')
         
         # Simple test query
-        message = client.messages.create(
-            model='claude-3-5-haiku-latest',
-            max_tokens=1000,
-            messages=[{
-                'role': 'user', 
-                'content': 'Search for "Magnus Carlsen chess reddit" and find any Reddit URLs. List any reddit.com links you find.'
-            }],
-            tools=[{
-                'type': 'web_search_20250305',
-                'name': 'web_search',
-                'max_uses': 2
-            }],
-            extra_headers={
-                'anthropic-beta': 'web-search-2025-03-05'
-            }
-        )
+        # Concurrent probes share a semaphore so they stay under the rate limit
+        async with semaphore or contextlib.nullcontext():
+            message = await client.messages.create(
+                model='claude-3-5-haiku-latest',
+                max_tokens=1000,
+                messages=[{
+                    'role': 'user', 
+                    'content': 'Search for "Magnus Carlsen chess reddit" and find any Reddit URLs. List any reddit.com links you find.'
+                }],
+                tools=[{
+                    'type': 'web_search_20250305',
+                    'name': 'web_search',
+                    'max_uses': 2
+                }],
+                extra_headers={
+                    'anthropic-beta': 'web-search-2025-03-05'
+                }
+            )
         
         print('✅ Message created successfully')
-        print(f'📊 Response type: {type(message)}')
-        print(f'📏 Content length: {len(message.content) if message.content else 0}')
+        log.debug('📊 Response type: %s', type(message))
+        log.debug('📏 Content length: %d', len(message.content) if message.content else 0)
         
         if message.content:
             for i, block in enumerate(message.content):
@@ -52,16 +63,18 @@ async def test_simple_web_search():
                 if hasattr(block, 'text'):
                     full_text += block.text
         
-        import re
-        reddit_urls = re.findall(r'https?://(?:www\.)?reddit\.com/r/[\w\-]+/comments/[\w\-]+/?[\w\-]*/?', full_text)
-        print(f'\n🔗 Found {len(reddit_urls)} Reddit URLs:')
-        for url in reddit_urls:
-            print(f'  - {url}')
+        url_count = 0
+        print('\n🔗 Reddit URLs:')
+        for match in REDDIT_URL_RE.finditer(full_text):
+            url_count += 1
+            print(f'  - {match.group()}')
+        print(f'🔗 Found {url_count} Reddit URLs')
                     
     except Exception as e:
         print(f'❌ Error: {type(e).__name__}: {e}')
-        import traceback
-        print(f'📍 Traceback: {traceback.format_exc()}')
+        log.error('📍 Traceback', exc_info=True)
 
 if __name__ == '__main__':
+    # Set LOG_LEVEL=DEBUG for response details
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
     asyncio.run(test_simple_web_search())
\ No newline at end of file